@@ -1,152 +1,964 @@
+import hashlib
+import math
+import threading
+import time
+import warnings
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
 import numpy as np
 from scipy.ndimage import zoom
 import torch
 import os
 
-def run_algorithm(system_params, roi_params, mat_data, log_callback=None, progress_callback=None):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+from Utilities.checkpoint import load_checkpoint, remove_checkpoint, save_checkpoint
+from Utilities.roi_data import read_roi_stack, roi_bounds
+from Utilities.zernike import describe, pupil_coefficients, zernike_basis
+
+# Most recently used LED precomputations, keyed by dataset geometry and run mode, up to
+# _PRECOMPUTE_CACHE_BYTES of tensors. The lock lets the GUI and its worker share it and is
+# reentrant because eviction finalizers can run from garbage collection while it is held
+_PRECOMPUTE_CACHE = OrderedDict()
+_PRECOMPUTE_CACHE_BYTES = 512 * 1024 ** 2
+_PRECOMPUTE_LOCK = threading.RLock()
+
+# Compiled LED updates, keyed by patch size, upsample, device and pupil recovery; None if compiling failed
+_COMPILED_STEPS = {}
+
+# Inductor keeps its compiled kernels here, so later processes skip code generation
+COMPILE_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "fpm_software", "inductor")
+
+
+def _led_patch_indices(ledpos, N):
+    """Row/column index grids addressing every LED's N x N sub-spectrum of O.
+
+    The grids are in native FFT order (zero frequency first), so gathered patches
+    go straight into ``ifft2`` and the results of ``fft2`` scatter straight back.
+    """
+    offsets = torch.fft.ifftshift(torch.arange(-N // 2, N // 2, device=ledpos.device))
+    rows = ledpos[:, 1, None] + offsets
+    cols = ledpos[:, 0, None] + offsets
+    ID_len = ledpos.shape[0]
+    return rows[:, :, None].expand(ID_len, N, N), cols[:, None, :].expand(ID_len, N, N)
+
+
+def _quadrants(N):
+    """(native, centered) slice pairs mapping an N x N patch in FFT order onto its centered layout.
+
+    Copying each native quadrant to its centered one is an fftshift done in place
+    on views, e.g. on an LED's sub-spectrum of O. N is even.
+    """
+    h = N // 2
+    halves = ((slice(0, h), slice(h, N)), (slice(h, N), slice(0, h)))
+    return [((rows, cols), (centered_rows, centered_cols))
+            for rows, centered_rows in halves for cols, centered_cols in halves]
+
+
+class LEDPrecomputation:
+    """LED quantities that stay constant for a dataset, ROI, upsample factor and mode.
+
+    Holds the sorted and mode-selected LED positions, the normalized sqrt
+    intensities as an (ID_len, N, N) stack, the captured-intensity gates, the
+    binary pupil with its update weight, the spectrum coverage (PupilSUM), the
+    groups of LEDs with disjoint pupils and the initial spectrum guess. Built
+    once, vectorized, and reused by re-runs.
+
+    The pupil, the weight and the patch index grids are kept in native FFT order,
+    so the LED loop never shifts a spectrum; ``run_algorithm`` converts pupils at
+    its input and output. O itself stays centered.
+    """
+
+    def __init__(self, imlow, roi, NA_cal_list, NA, NA_cal, dpix, wavelength, upsample, mode, tol, device):
+        k0 = 2 * np.pi / wavelength
+        kmax = NA_cal * k0
+
+        # Sort by illumination angle
+        u = -NA_cal_list[:, 0]
+        v = -NA_cal_list[:, 1]
+        NAillu = np.sqrt(u**2 + v**2)
+        order = np.argsort(NAillu)
+        NAillu = NAillu[order]
 
-    # Extract raw intensity images
-    I_low = mat_data["imlow"].astype("float32")
-    H, W, _ = I_low.shape
+        # Select mode
+        if mode == "bright":
+            idx = np.where(NAillu <= NA + tol)[0]
+        elif mode == "dark":
+            idx = np.where(NAillu > NA + tol)[0]
+        else:
+            idx = np.arange(len(NAillu))
 
-    # Extract ROI
-    cx = roi_params.get("x_offset", W // 2)
-    cy = roi_params.get("y_offset", H // 2)
-    roi_size = roi_params.get("roi_size", 256)
+        self.frames = order[idx]
+        u = u[self.frames]
+        v = v[self.frames]
 
-    I_ROI = I_low[cy:cy + roi_size, cx:cx + roi_size, :]
-    I_ROI = I_ROI[:roi_size, :roi_size, :]  # Ensures fixed size
+        # Only the ROI of the selected frames is read, already LED-major and float32
+        I = read_roi_stack(imlow, *roi, frames=self.frames)
+        N = I.shape[1]
+        N_up = N * upsample
+        self.ID_len = len(idx)
+        self.N = N
+        self.upsample = upsample
 
-    # Load system parameters
-    NA = float(mat_data.get("NA", 0.1))
-    dpix_cam = float(mat_data.get("dpix_c", 3.45))
-    wavelength = float(mat_data.get("lambda", 0.5))
-    mag = float(mat_data.get("mag", 10.0))
-    NA_cal = float(mat_data.get("NA", NA))
+        # Frequency grid
+        Fxx1 = np.arange(-N_up // 2, N_up // 2) / (N * dpix) * (2 * np.pi)
+        Fyy1 = np.arange(-N_up // 2, N_up // 2) / (N * dpix) * (2 * np.pi)
+
+        # LED positions in frequency space
+        ledpos = np.stack([
+            np.argmin(np.abs(Fxx1[None, :] - k0 * u[:, None]), axis=1),
+            np.argmin(np.abs(Fyy1[None, :] - k0 * v[:, None]), axis=1),
+        ], axis=1)
+        self.ledpos = torch.from_numpy(ledpos).to(device)
+
+        # Normalized intensities, in place
+        I /= np.max(I)
+
+        # Initial guess, from the lowest-angle frame
+        o = np.sqrt(zoom(I[0], upsample, order=1)).astype("complex64")
+        self.O_init = torch.fft.fftshift(torch.fft.fft2(torch.from_numpy(o).to(device)))
+
+        # Square roots, stored LED-major; on the CPU torch works in I's buffer
+        sqrt_I = torch.from_numpy(I).to(device).sqrt_()
+        self.sqrt_I = sqrt_I
+        self.intensity_gate = torch.mean(sqrt_I ** 2, dim=(-2, -1)) > 0.1
+
+        # Binary pupil and the object update weight it implies
+        Fx1, Fy1 = np.meshgrid(np.arange(-N / 2, N / 2), np.arange(-N / 2, N / 2))
+        Fxy2 = ((Fx1 / (N * dpix) * 2 * np.pi) ** 2 + (Fy1 / (N * dpix) * 2 * np.pi) ** 2)
+        Pupil = np.zeros((N, N))
+        Pupil[Fxy2 <= kmax**2] = 1
+        self.Pupil0 = torch.fft.ifftshift(torch.from_numpy(Pupil.astype("float32"))).to(device)
+        self.quadrants = _quadrants(N)
+        # Complex copy for in-place products, which would otherwise promote Pupil0 every time
+        self.Pupil0_complex = self.Pupil0.to(torch.complex64)
+        self.weight = self.update_weight(self.Pupil0_complex)
+
+        # Number of LEDs whose pupil covers each frequency; its support is PupilSUM
+        self.rows, self.cols = _led_patch_indices(self.ledpos, N)
+        self.coverage = torch.zeros((N_up, N_up), device=device).index_put_(
+            (self.rows, self.cols), self.Pupil0.expand(self.ID_len, N, N), accumulate=True)
+        self.PupilSUM = (self.coverage > 0).to(torch.complex64)
+
+        # Groups of LEDs with disjoint pupil supports, updated together by the batched loop
+        radius = float(np.sqrt(Fx1 ** 2 + Fy1 ** 2)[Pupil > 0].max()) if Pupil.any() else 0.0
+        self.groups = [torch.tensor(group, device=device) for group in _disjoint_groups(ledpos, radius)]
+
+    def update_weight(self, Pupil):
+        """Spectrum update weight for the given pupil estimate."""
+        return torch.abs(Pupil) * torch.conj(Pupil) / torch.abs(Pupil).max() / \
+            (torch.abs(Pupil) ** 2 + 1) * torch.conj(self.Pupil0)
+
+    def nbytes(self):
+        """Bytes held by the cached tensors, on whichever device they live."""
+        tensors = (self.sqrt_I, self.intensity_gate, self.O_init, self.Pupil0, self.Pupil0_complex, self.weight,
+                   self.coverage, self.PupilSUM, *self.groups)
+        # rows and cols are expanded (ID_len, N) grids
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors) + \
+            2 * self.ID_len * self.N * self.rows.element_size()
+
+
+def _evict_precomputation(key, entry_ref):
+    """Drop the cache entry at ``key`` if it is still the one ``entry_ref`` points to."""
+    with _PRECOMPUTE_LOCK:
+        entry = entry_ref()
+        if entry is not None and _PRECOMPUTE_CACHE.get(key) is entry:
+            del _PRECOMPUTE_CACHE[key]
+
+
+def get_led_precomputation(mat_data, roi_params, upsample, mode, tol, device):
+    """Return the LEDPrecomputation for this dataset and run mode, building it on a cache miss.
+
+    Entries are keyed by NA_list, ROI, upsample, mode, tolerance and optics, and
+    are only reused while they still refer to the same ``imlow`` array.
+    """
+    imlow = mat_data["imlow"]
+    roi = roi_bounds(imlow.shape, roi_params)
+
+    # Load system parameters (scipy.io returns scalars as 1x1 arrays)
+    scalar = lambda key, default: float(np.asarray(mat_data.get(key, default), dtype="float64").ravel()[0])
+    NA = scalar("NA", 0.1)
+    dpix_cam = scalar("dpix_c", 3.45)
+    wavelength = scalar("lambda", 0.5)
+    mag = scalar("mag", 10.0)
+    NA_cal = scalar("NA", NA)
     NA_cal_list = mat_data["NA_list"].astype("float32")
 
-    dpix = dpix_cam / mag
-    k0 = 2 * np.pi / wavelength
-    kmax = NA_cal * k0
+    key = (hashlib.sha1(NA_cal_list.tobytes()).hexdigest(), NA_cal_list.shape, roi,
+           upsample, mode, tol, NA, NA_cal, dpix_cam, wavelength, mag, str(device))
+    with _PRECOMPUTE_LOCK:
+        # Entries whose dataset is gone can never match again
+        for stale in list(_PRECOMPUTE_CACHE):
+            if stale in _PRECOMPUTE_CACHE and _PRECOMPUTE_CACHE[stale].source() is None:
+                del _PRECOMPUTE_CACHE[stale]
+        entry = _PRECOMPUTE_CACHE.get(key)
+        if entry is not None and entry.source() is imlow:
+            _PRECOMPUTE_CACHE.move_to_end(key)
+            return entry
+
+        entry = LEDPrecomputation(imlow, roi, NA_cal_list, NA, NA_cal, dpix_cam / mag, wavelength,
+                                  upsample, mode, tol, device)
+        entry.source = weakref.ref(imlow)
+        # Free the entry as soon as its dataset is collected, not at the next lookup
+        weakref.finalize(imlow, _evict_precomputation, key, weakref.ref(entry))
+        _PRECOMPUTE_CACHE[key] = entry
+        # Evict least recently used entries past the byte budget, always keeping this one
+        while len(_PRECOMPUTE_CACHE) > 1 and \
+                sum(cached.nbytes() for cached in list(_PRECOMPUTE_CACHE.values())) > _PRECOMPUTE_CACHE_BYTES:
+            _PRECOMPUTE_CACHE.popitem(last=False)
+        return entry
+
+
+def _phase_timer(profile_callback, device):
+    """Return ``phase(name, **info)``, a context manager timing one phase of the run.
+
+    Each phase is reported as ``profile_callback(name, start, duration, info)``
+    with ``time.perf_counter()`` seconds. CUDA is synchronized around every
+    phase so kernel time is attributed correctly. Without a callback the
+    returned context manager does nothing.
+    """
+    if profile_callback is None:
+        null = nullcontext()
+        return lambda name, **info: null
+
+    synchronize = torch.cuda.synchronize if device.type == "cuda" else (lambda: None)
+
+    @contextmanager
+    def phase(name, **info):
+        synchronize()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            synchronize()
+            profile_callback(name, start, time.perf_counter() - start, info)
+
+    return phase
+
+
+def _descending(score):
+    """Indices sorting a CPU ``score`` tensor in descending order, ties kept in index order."""
+    # torch.argsort only takes stable=True from torch 1.13
+    return torch.from_numpy(np.argsort(-score.numpy(), kind="stable"))
+
+
+class LEDScheduler:
+    """Chooses which LEDs an iteration visits, and in which order.
+
+    LEDs failing the captured intensity gate are only visited by refresh
+    iterations, since their update leaves O unchanged. The others are scored by
+    the mean intensity of their captured frame times the relative size of their
+    latest spectrum update. An LED has converged when its update is below a
+    fraction ``tol`` of the largest gated-in update; it is dropped until the
+    next refresh iteration. Every ``REFRESH_INTERVAL`` iterations, starting
+    with the first, a refresh visits every LED, highest score first. ``selection`` is
+    "priority" (all remaining LEDs, highest score first) or "stochastic" (a
+    ``fraction`` of them, drawn with probability proportional to score from a
+    seeded generator). The run error sums the most recent error of every LED,
+    so it has the scale of an "all" run and stays comparable between
+    iterations.
+    """
+
+    REFRESH_INTERVAL = 5
+
+    def __init__(self, pre, selection, fraction=0.5, tol=0.05, seed=0):
+        if selection not in ("priority", "stochastic"):
+            raise ValueError(f"Unknown LED selection '{selection}'")
+        self.selection = selection
+        self.fraction = fraction
+        self.tol = tol
+        self.information = torch.mean(pre.sqrt_I ** 2, dim=(-2, -1)).cpu()
+        self.gate = pre.intensity_gate.cpu()
+        self.change = torch.ones(pre.ID_len)
+        self.errors = torch.zeros(pre.ID_len)
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def is_refresh(self, stage_iter):
+        """Whether iteration ``stage_iter`` of the stage visits every LED."""
+        return stage_iter % self.REFRESH_INTERVAL == 0
+
+    def select(self, stage_iter):
+        """LED indices to visit in iteration ``stage_iter`` of the stage, in visiting order."""
+        if self.is_refresh(stage_iter):
+            # Gated-out LEDs score zero, so they come last and only have their error measured
+            score = self.information * self.change * self.gate
+            return _descending(score)
+        candidates = torch.nonzero(self.gate & ~self.converged()).flatten()
+        if not len(candidates):
+            return candidates
+        score = self.information[candidates] * self.change[candidates]
+        if self.selection == "stochastic":
+            count = max(1, math.ceil(self.fraction * len(candidates)))
+            order = torch.multinomial(score + 1e-12, count, replacement=False, generator=self.generator)
+        else:
+            order = _descending(score)
+        return candidates[order]
+
+    def converged(self):
+        """LEDs whose update is small next to the largest gated-in one."""
+        if not self.gate.any():
+            return torch.zeros_like(self.gate)
+        return self.change < self.tol * self.change[self.gate].max()
+
+    def update(self, leds, errors, changes):
+        """Record the squared error and relative update size of the visited ``leds``."""
+        self.errors[leds] = errors.float().cpu()
+        self.change[leds] = changes.float().cpu()
+
+    def error(self):
+        """Squared amplitude error over all LEDs, using the latest error of skipped ones."""
+        return self.errors.sum()
+
+    def state_dict(self):
+        return {"change": self.change, "errors": self.errors, "generator": self.generator.get_state()}
+
+    def load_state_dict(self, state):
+        self.change = state["change"].cpu()
+        self.errors = state["errors"].cpu()
+        self.generator.set_state(state["generator"].cpu())
+
+
+def _batched_iteration(O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, leds=None, stats=None):
+    """Update the LEDs group by group, each group with one batched FFT pair.
+
+    The LEDs of a group (``pre.groups``) have disjoint pupil supports in O, so
+    their updates neither read nor write the same frequency, and updating a
+    group at once gives what updating its LEDs one after another would. An
+    iteration is therefore a sequential iteration in group order and converges
+    like one, with a batch of FFTs per group instead of a pair per LED. With
+    ``use_pupil_correction`` the pupil takes one least-squares step from all LED
+    corrections and the update ``weight`` is rebuilt from it; otherwise the
+    pupil is restricted to the binary support and ``weight`` is used as given.
+    Returns the squared amplitude error and the pupil.
+
+    ``leds`` restricts the update to those LED indices. A ``stats`` dict
+    receives each visited LED's squared error and relative update size as
+    ``stats["errors"]`` and ``stats["changes"]``, in the order of ``leds``.
+    """
+    groups = pre.groups
+    if leds is not None:
+        leds = leds.to(pre.ledpos.device)
+        visited = torch.zeros(pre.ID_len, dtype=torch.bool, device=pre.ledpos.device)
+        visited[leds] = True
+        groups = [group[visited[group]] for group in groups]
+        groups = [group for group in groups if len(group)]
+
+    if use_pupil_correction:
+        weight = pre.update_weight(Pupil)
+        pupil_step = torch.zeros_like(Pupil)
+        pupil_norm = torch.zeros_like(pre.Pupil0)
+    else:
+        Pupil = pre.Pupil0_complex * torch.exp(1j * torch.angle(Pupil))
+    errors = torch.zeros(pre.ID_len, device=O.device)
+    changes = torch.zeros(pre.ID_len, device=O.device)
+    pupil_scale = Pupil * pre.Pupil0 / (pre.upsample ** 2)
+    step_weight = alpha * weight
+    positions = pre.ledpos.tolist()
+    h = pre.N // 2
+
+    for group in groups:
+        sqrt_I = pre.sqrt_I[group]
+        with phase("gather"):
+            # Each LED's centered sub-spectrum of O, copied into native FFT order by quadrants
+            patches = [O[v - h:v + h, u - h:u + h] for u, v in (positions[i] for i in group.tolist())]
+            temp = torch.empty((len(patches), pre.N, pre.N), dtype=O.dtype, device=O.device)
+            for patch, native_patch in zip(patches, temp):
+                for native, centered in pre.quadrants:
+                    native_patch[native] = patch[centered]
+            OP_bef = temp * pupil_scale
+        with phase("ifft2"):
+            o_bef = torch.fft.ifft2(OP_bef)
+
+        with phase("intensity_constraint"):
+            amplitude = torch.abs(o_bef)
+            gate = pre.intensity_gate[group] & (torch.mean(amplitude ** 2, dim=(-2, -1)) > 0.1)
+            o_aft = torch.where(gate[:, None, None], sqrt_I / amplitude * o_bef, o_bef)
+
+        with phase("fft2"):
+            OP_aft = torch.fft.fft2(o_aft)
+
+        with phase("spectrum_update"):
+            OP_diff = OP_aft - OP_bef
+            # The patches overlap only where the weight is zero, so their order does not matter
+            for patch, native_update in zip(patches, OP_diff * step_weight):
+                for native, centered in pre.quadrants:
+                    patch[centered] += native_update[native]
+
+        if use_pupil_correction:
+            with phase("pupil_update"):
+                S = temp * pre.Pupil0 / (pre.upsample ** 2)
+                pupil_step += torch.sum(torch.conj(S) * OP_diff, dim=0)
+                pupil_norm += torch.sum(torch.abs(S) ** 2, dim=0)
+
+        with phase("error"):
+            errors[group] = torch.sum((amplitude - sqrt_I) ** 2, dim=(-2, -1))
+            if stats is not None:
+                changes[group] = torch.sum(torch.abs(OP_diff) ** 2, dim=(-2, -1)) / \
+                    torch.sum(torch.abs(OP_bef) ** 2, dim=(-2, -1)).clamp(min=1e-30)
+
+    if use_pupil_correction:
+        with phase("pupil_update"):
+            Pupil = _pupil_update(Pupil, pupil_step, pupil_norm, pre, beta)
+    if stats is not None:
+        stats["errors"] = errors if leds is None else errors[leds]
+        stats["changes"] = changes if leds is None else changes[leds]
+    return errors.sum(), Pupil
+
+
+def _disjoint_groups(ledpos, radius):
+    """Partition the LEDs, in order, into groups whose pupil supports do not overlap.
+
+    Supports of ``radius`` pixels around LED positions further apart than their
+    diameter share no frequency. Each LED joins the first group it fits into.
+    """
+    groups = []
+    for i, position in enumerate(ledpos):
+        for group in groups:
+            if np.all(np.hypot(*(ledpos[group] - position).T) > 2 * radius):
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+    return groups
+
+
+def _pupil_update(Pupil, step, norm, pre, beta):
+    """Embedded pupil recovery step from the LED corrections of one iteration.
+
+    ``step`` sums conj(S_i) * dPsi_i and ``norm`` sums |S_i|^2 over the LEDs,
+    where S_i is an LED's object patch and dPsi_i its exit-wave correction. Their
+    regularized ratio is the least-squares pupil correction for all LEDs at once,
+    so ``beta`` = 1 takes the full step. The corrected pupil keeps the binary
+    amplitude of Pupil0 and only its phase is recovered; a free amplitude drifts
+    and trades off against the object.
+    """
+    Pupil = Pupil + beta * step / (norm + 1e-3 * norm.max().clamp(min=1e-30)) * pre.Pupil0
+    return pre.Pupil0 * torch.exp(1j * torch.angle(Pupil))
+
+
+class ZernikeProjection:
+    """Restricts the pupil phase to Zernike modes up to radial ``order``.
+
+    Piston and tilt are left out, since they only rephase or shift the object.
+    Each call refines the coefficients by one Gauss-Newton step on the wrapped
+    phase residual, starting from the previous ones, so phases beyond +-pi are
+    followed as they grow. The pupil amplitude is kept. Pupils are in native FFT
+    order, like ``LEDPrecomputation.Pupil0``; the modes are fitted centered.
+    """
+
+    def __init__(self, Pupil0, order):
+        Pupil0 = torch.fft.fftshift(Pupil0)
+        self.mask = Pupil0 != 0
+        modes = zernike_basis(Pupil0.cpu().numpy(), order)[3:]
+        self.basis = torch.from_numpy(modes[:, self.mask.cpu().numpy()].T.astype("float32")).to(Pupil0.device)
+        self.pinv = torch.linalg.pinv(self.basis)
+        self.coefficients = torch.zeros(self.basis.shape[1], device=Pupil0.device)
+
+    def __call__(self, Pupil):
+        Pupil = torch.fft.fftshift(Pupil)
+        values = Pupil[self.mask]
+        residual = torch.angle(values * torch.exp(-1j * (self.basis @ self.coefficients)))
+        self.coefficients += self.pinv @ residual
+        projected = torch.zeros_like(Pupil)
+        projected[self.mask] = torch.abs(values) * torch.exp(1j * (self.basis @ self.coefficients))
+        return torch.fft.ifftshift(projected)
+
+
+class WorkBuffers:
+    """N x N temporaries of the sequential LED loop, allocated once per run.
+
+    ``_sequential_iteration`` writes every intermediate of an LED update into
+    these with ``out=`` and in-place ops, so iterations allocate no patch-sized
+    tensors after the first.
+    """
+
+    def __init__(self, N, device):
+        complex_buffer = lambda: torch.empty((N, N), dtype=torch.complex64, device=device)
+        self.N = N
+        self.OP_bef = complex_buffer()
+        self.o_bef = complex_buffer()
+        self.o_aft = complex_buffer()
+        # OP_aft becomes OP_diff in place
+        self.OP_aft = complex_buffer()
+        self.update = complex_buffer()
+        self.scale = complex_buffer()
+        self.S = complex_buffer()
+        self.pupil_step = complex_buffer()
+        self.real = torch.empty((N, N), device=device)
+        self.pupil_norm = torch.empty((N, N), device=device)
+
+
+def _sequential_iteration(O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, iter,
+                          leds=None, stats=None, buffers=None):
+    """Update the LEDs one after another, each with its own FFT pair.
+
+    Returns the squared amplitude error with the updated pupil and update weight.
+    ``leds`` and ``stats`` work as in ``_batched_iteration``. ``buffers`` is the
+    run's ``WorkBuffers``; without it they are allocated for this iteration. A
+    pupil that is not recovered is restricted to the binary support in place,
+    once before the LEDs.
+    """
+    N = pre.N
+    Pupil0 = pre.Pupil0_complex
+    if buffers is None:
+        buffers = WorkBuffers(N, O.device)
+    OP_bef, o_bef, OP_diff, update, real = buffers.OP_bef, buffers.o_bef, buffers.OP_aft, buffers.update, buffers.real
+    error_now = 0
+    # Pupil and weight are in native FFT order; the LED's centered sub-spectrum of
+    # O is read and written quadrant by quadrant instead of being fftshifted
+    up2 = pre.upsample ** 2
+    led_errors, led_changes = [], []
+    if use_pupil_correction:
+        pupil_step, pupil_norm = buffers.pupil_step.zero_(), buffers.pupil_norm.zero_()
+    else:
+        # Pupil0 * exp(i angle(Pupil)) does not change a pupil it was already applied
+        # to, and nothing else changes the pupil, so applying it once is enough
+        with phase("pupil_update", iter=iter):
+            phasor = update.copy_(torch.angle(Pupil, out=real)).mul_(1j).exp_()
+            torch.mul(Pupil0, phasor, out=Pupil)
+    for i in (range(pre.ID_len) if leds is None else leds.tolist()):
+        with phase("led", iter=iter, led=i):
+            uo, vo = pre.ledpos[i]
+            with phase("gather", iter=iter, led=i):
+                temp = O[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2]
+                for native, centered in pre.quadrants:
+                    torch.mul(temp[centered], Pupil[native], out=OP_bef[native])
+                OP_bef.mul_(Pupil0).div_(up2)
+            with phase("ifft2", iter=iter, led=i):
+                torch.fft.ifft2(OP_bef, out=o_bef)
+
+            with phase("intensity_constraint", iter=iter, led=i):
+                oI_bef = torch.abs(o_bef, out=real).pow_(2)
+                if pre.intensity_gate[i] and torch.mean(oI_bef) > 0.1:
+                    scale = buffers.scale.copy_(torch.div(pre.sqrt_I[i], oI_bef.sqrt_(), out=real))
+                    o_aft = torch.mul(scale, o_bef, out=buffers.o_aft)
+                else:
+                    o_aft = o_bef
+
+            with phase("fft2", iter=iter, led=i):
+                torch.fft.fft2(o_aft, out=OP_diff)
+
+            with phase("spectrum_update", iter=iter, led=i):
+                OP_diff.sub_(OP_bef)
+                if use_pupil_correction:
+                    # Object patch before this LED's update (temp is a view of O)
+                    S = buffers.S
+                    for native, centered in pre.quadrants:
+                        S[native] = temp[centered]
+                    S.mul_(Pupil0).div_(up2)
+                    pupil_step.add_(torch.mul(torch.conj(S), OP_diff, out=update))
+                    pupil_norm.add_(torch.abs(S, out=real).pow_(2))
+                torch.mul(OP_diff, alpha, out=update).mul_(weight)
+                for native, centered in pre.quadrants:
+                    temp[centered] += update[native]
+
+            with phase("error", iter=iter, led=i):
+                led_error = torch.sum(torch.abs(o_bef, out=real).sub_(pre.sqrt_I[i]).pow_(2))
+                error_now += led_error
+                if stats is not None:
+                    led_errors.append(led_error)
+                    led_changes.append(torch.sum(torch.abs(OP_diff, out=real).pow_(2)) /
+                                       torch.sum(torch.abs(OP_bef, out=real).pow_(2)).clamp(min=1e-30))
+    if stats is not None and led_errors:
+        stats["errors"], stats["changes"] = torch.stack(led_errors), torch.stack(led_changes)
+    if use_pupil_correction:
+        with phase("pupil_update", iter=iter):
+            Pupil = _pupil_update(Pupil, pupil_step, pupil_norm, pre, beta)
+            weight = pre.update_weight(Pupil)
+    return error_now, Pupil, weight
+
+
+def _led_step(temp, pupil, pupil_scale, weight, sqrt_I, gate, alpha,
+              pupil_step, pupil_norm, correct_pupil: bool):
+    """One sequential LED update in real arithmetic, for torch.compile or TorchScript.
+
+    Inductor generates no code for complex tensors, so complex arguments arrive
+    as ``torch.view_as_real`` views and the products are written out. ``temp`` is
+    the LED's centered sub-spectrum of O; the pupil, weight and ``pupil_scale``
+    (Pupil0 / upsample^2) are in native FFT order as in ``_sequential_iteration``.
+    Updates ``temp`` and, with ``correct_pupil``, the pupil recovery sums in
+    place. Returns the LED's squared amplitude error and relative update size.
+    """
+    shifts = (temp.shape[0] // 2, temp.shape[1] // 2)
+    t = torch.roll(temp, shifts=shifts, dims=(0, 1))
+    tr, ti = t[..., 0], t[..., 1]
+    pr, pi = pupil[..., 0], pupil[..., 1]
+    OP_bef = torch.stack(((tr * pr - ti * pi) * pupil_scale, (tr * pi + ti * pr) * pupil_scale), -1)
+    o_bef = torch.view_as_real(torch.fft.ifft2(torch.view_as_complex(OP_bef)))
+
+    oI_bef = o_bef[..., 0] * o_bef[..., 0] + o_bef[..., 1] * o_bef[..., 1]
+    amplitude = torch.sqrt(oI_bef)
+    o_aft = torch.where(gate & (oI_bef.mean() > 0.1), o_bef * (sqrt_I / amplitude)[..., None], o_bef)
+    OP_aft = torch.view_as_real(torch.fft.fft2(torch.view_as_complex(o_aft)))
+
+    OP_diff = OP_aft - OP_bef
+    dr, di = OP_diff[..., 0], OP_diff[..., 1]
+    wr, wi = weight[..., 0], weight[..., 1]
+    update = torch.stack((dr * wr - di * wi, dr * wi + di * wr), -1) * alpha
+    if correct_pupil:
+        # Object patch before this LED's update
+        sr, si = tr * pupil_scale, ti * pupil_scale
+        pupil_step.add_(torch.stack((sr * dr + si * di, sr * di - si * dr), -1))
+        pupil_norm.add_(sr * sr + si * si)
+    temp.add_(torch.roll(update, shifts=shifts, dims=(0, 1)))
+
+    error = torch.sum((amplitude - sqrt_I) ** 2)
+    change = torch.sum(OP_diff * OP_diff) / torch.sum(OP_bef * OP_bef).clamp(min=1e-30)
+    return error, change
+
+
+def compiled_led_step(N, upsample, device, correct_pupil, log_callback=None):
+    """``_led_step`` compiled for N x N patches of an N*upsample spectrum on ``device``.
+
+    Returns None if neither compiler works. Tries torch.compile, then
+    TorchScript, and compiles once per process and shape by running the step on
+    zeros laid out like the real arguments; ``temp`` is a strided view of the
+    spectrum, so a contiguous stand-in would make Dynamo compile again on the
+    first real call. Inductor's on-disk cache, under COMPILE_CACHE_DIRECTORY
+    unless TORCHINDUCTOR_CACHE_DIR is set, lets later processes reuse the
+    generated kernels.
+    """
+    key = (N, upsample, str(device), bool(correct_pupil))
+    if key in _COMPILED_STEPS:
+        return _COMPILED_STEPS[key]
+
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", COMPILE_CACHE_DIRECTORY)
+    complex_zeros = lambda: torch.view_as_real(torch.zeros((N, N), dtype=torch.complex64, device=device))
+    patch_zeros = lambda: torch.view_as_real(
+        torch.zeros((N * upsample, N * upsample), dtype=torch.complex64, device=device)[:N, :N])
+    real_zeros = lambda: torch.zeros((N, N), device=device)
+    step = None
+    for name, compile_step in (("torch.compile", lambda f: torch.compile(f, dynamic=False)),
+                               ("TorchScript", torch.jit.script)):
+        if log_callback:
+            log_callback(f"Compiling the {N}x{N} LED update with {name}...")
+        try:
+            candidate = compile_step(_led_step)
+            with warnings.catch_warnings():
+                # Inductor warns that it leaves the complex FFTs to eager kernels
+                warnings.simplefilter("ignore")
+                candidate(patch_zeros(), complex_zeros(), real_zeros(), complex_zeros(), real_zeros(),
+                          torch.tensor(False, device=device), torch.tensor(0.0, device=device),
+                          complex_zeros(), real_zeros(), bool(correct_pupil))
+        except Exception as error:
+            if log_callback:
+                log_callback(f"{name} failed ({type(error).__name__}: {error}).")
+            continue
+        step = candidate
+        break
+    if step is None and log_callback:
+        log_callback("Using the eager LED update.")
+    _COMPILED_STEPS[key] = step
+    return step
+
+
+def _compiled_iteration(O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, iter,
+                        step, leds=None, stats=None, buffers=None):
+    """``_sequential_iteration`` with each LED update done by the compiled ``step``.
+
+    Gives the same result up to float rounding, since the compiled kernels fuse
+    and reorder the arithmetic. A pupil that is not recovered is restricted to
+    the binary support once before the LEDs, as in ``_sequential_iteration``.
+    """
+    if buffers is None:
+        buffers = WorkBuffers(pre.N, O.device)
+    N = pre.N
+    error_now = 0
+    led_errors, led_changes = [], []
+    pupil_step, pupil_norm = buffers.pupil_step.zero_(), buffers.pupil_norm.zero_()
+    pupil_scale = pre.Pupil0 / (pre.upsample ** 2)
+    alpha = torch.tensor(alpha, device=O.device)
+    if not use_pupil_correction:
+        with phase("pupil_update", iter=iter):
+            Pupil = pre.Pupil0_complex * torch.exp(1j * torch.angle(Pupil))
+    with warnings.catch_warnings():
+        # Inductor warns on every call that it leaves the complex FFTs to eager kernels
+        warnings.simplefilter("ignore")
+        for i in (range(pre.ID_len) if leds is None else leds.tolist()):
+            with phase("led", iter=iter, led=i):
+                uo, vo = pre.ledpos[i]
+                temp = O[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2]
+                led_error, led_change = step(
+                    torch.view_as_real(temp), torch.view_as_real(Pupil), pupil_scale,
+                    torch.view_as_real(weight), pre.sqrt_I[i], pre.intensity_gate[i], alpha,
+                    torch.view_as_real(pupil_step), pupil_norm, use_pupil_correction)
+                error_now += led_error
+                if stats is not None:
+                    led_errors.append(led_error)
+                    led_changes.append(led_change)
+    if stats is not None and led_errors:
+        stats["errors"], stats["changes"] = torch.stack(led_errors), torch.stack(led_changes)
+    if use_pupil_correction:
+        with phase("pupil_update", iter=iter):
+            Pupil = _pupil_update(Pupil, pupil_step, pupil_norm, pre, beta)
+            weight = pre.update_weight(Pupil)
+    return error_now, Pupil, weight
+
+
+def parse_schedule(schedule, mat_data, roi_size, upsample, mode, tol, num_iters):
+    """Stages of a run as ``[(upsample, mode, iterations), ...]``, ending with the main stage.
+
+    ``schedule`` lists coarse stages run before the main ``upsample``/``mode``
+    stage as comma-separated ``upsample:mode:iterations``, e.g.
+    ``"auto:bright:10, 2:all:10"``. ``auto``, or an upsample too small to hold
+    the stage's LED pupils, becomes the smallest one that does.
+    """
+    from Utilities.resource_estimator import minimum_upsample
+
+    stages = []
+    for text in filter(None, (part.strip() for part in str(schedule or "").split(","))):
+        try:
+            stage_upsample, stage_mode, stage_iters = (field.strip() for field in text.split(":"))
+            stage_iters = int(stage_iters)
+            lowest = minimum_upsample(mat_data, roi_size, stage_mode, tol)
+            stage_upsample = lowest if stage_upsample == "auto" else max(int(stage_upsample), lowest)
+        except ValueError:
+            raise ValueError(f"Schedule stage must be upsample:mode:iterations, got '{text}'")
+        if stage_mode not in ("bright", "dark", "all"):
+            raise ValueError(f"Unknown mode '{stage_mode}' in schedule stage '{text}'")
+        if stage_upsample > upsample:
+            raise ValueError(f"Schedule stage '{text}' upsamples more than the final upsample {upsample}")
+        stages.append((stage_upsample, stage_mode, stage_iters))
+    stages.append((upsample, mode, num_iters))
+    return stages
+
+
+def _upsample_spectrum(O, size):
+    """Zero-pad a centered spectrum to ``size`` x ``size``, keeping the object's amplitude."""
+    n = O.shape[0]
+    offset = (size + 1) // 2 - (n + 1) // 2
+    padded = torch.zeros((size, size), dtype=O.dtype, device=O.device)
+    padded[offset:offset + n, offset:offset + n] = O * (size / n) ** 2
+    return padded
+
+
+def run_algorithm(system_params, roi_params, mat_data, log_callback=None, progress_callback=None,
+                  cancel_callback=None, profile_callback=None, error_callback=None, checkpoint_path=None,
+                  init_object=None, init_pupil=None):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    phase = _phase_timer(profile_callback, device)
 
     # Parameters
     upsample = int(system_params.get("upsample", 3))
-    alpha = float(system_params.get("alpha", 1.0))
-    beta = float(system_params.get("beta", 0.1))
+    alpha0 = float(system_params.get("alpha", 1.0))
+    beta0 = float(system_params.get("beta", 1.0))
     num_iters = int(system_params.get("num_iters", 50))
     mode = system_params.get("mode", "all")
     tol = float(system_params.get("tol", 0.05))
-    use_pupil_correction = False
-
-    N = I_ROI.shape[0]
-    N_up = N * upsample
-
-    # Frequency grid
-    Fxx1, Fyy1 = np.meshgrid(np.arange(-N_up // 2, N_up // 2), np.arange(-N_up // 2, N_up // 2))
-    Fxx1 = Fxx1[0, :] / (N * dpix) * (2 * np.pi)
-    Fyy1 = Fyy1[:, 0] / (N * dpix) * (2 * np.pi)
-
-    # Sort by illumination angle
-    u = -NA_cal_list[:, 0]
-    v = -NA_cal_list[:, 1]
-    NAillu = np.sqrt(u**2 + v**2)
-    order = np.argsort(NAillu)
-    u = u[order]
-    v = v[order]
-    I_ROI = I_ROI[:, :, order]
-    NAillu = NAillu[order]
-
-    # Select mode
-    if mode == "bright":
-        idx = np.where(NAillu <= NA + tol)[0]
-    elif mode == "dark":
-        idx = np.where(NAillu > NA + tol)[0]
-    else:
-        idx = np.arange(len(NAillu))
-
-    u = u[idx]
-    v = v[idx]
-    I = I_ROI[:, :, idx]
-    ID_len = len(idx)
-
-    # LED positions in frequency space
-    ledpos = np.zeros((ID_len, 2), dtype=int)
-    for i in range(ID_len):
-        ledpos[i, 0] = np.argmin(np.abs(Fxx1 - k0 * u[i]))
-        ledpos[i, 1] = np.argmin(np.abs(Fyy1 - k0 * v[i]))
-
-    # Normalize and define pupil function
-    Isum = I / np.max(I)
-    Fx1, Fy1 = np.meshgrid(np.arange(-N / 2, N / 2), np.arange(-N / 2, N / 2))
-    Fxy2 = ((Fx1 / (N * dpix) * 2 * np.pi) ** 2 + (Fy1 / (N * dpix) * 2 * np.pi) ** 2)
-    Pupil = np.zeros((N, N))
-    Pupil[Fxy2 <= kmax**2] = 1
-    Pupil0 = torch.from_numpy(Pupil.astype("float32")).to(device)
-
-    # Initial guess
-    o = np.sqrt(zoom(Isum[:, :, 0], upsample, order=1)).astype("complex64")
-    O = torch.fft.fftshift(torch.fft.fft2(torch.from_numpy(o).to(device)))
-
-    # Prepare tensors
-    Pupil = Pupil0.clone().to(torch.complex64)
-    Isum = torch.from_numpy(Isum).to(device)
-    ledpos = torch.from_numpy(ledpos).to(device)
-    PupilSUM = torch.zeros_like(O)
-    error_bef = 1e10
-
-    for iter in range(num_iters):
-        if progress_callback:
-            progress_callback(int(100 * iter / num_iters))
-        error_now = 0
-
+    batched = bool(system_params.get("batched", False))
+    compiled = bool(system_params.get("compiled", False))
+    checkpoint_interval = int(system_params.get("checkpoint_interval", 0))
+    led_selection = system_params.get("led_selection", "all")
+    led_fraction = float(system_params.get("led_fraction", 0.5))
+    led_tol = float(system_params.get("led_tol", 0.05))
+    use_pupil_correction = bool(system_params.get("pupil_correction", False))
+    zernike_order = int(system_params.get("zernike_order", 4))
+    if compiled and device.type != "cuda":
+        # On the CPU compiling costs 7-35 s per ROI size and process and saves 5-20% per iteration
         if log_callback:
-            log_callback(f"Iteration {iter+1}/{num_iters}...")
-
-        for i in range(ID_len):
-            uo, vo = ledpos[i]
-            temp = O[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2]
-            OP_bef = temp * Pupil * Pupil0 / (upsample ** 2)
-            o_bef = torch.fft.ifft2(torch.fft.fftshift(OP_bef))
-            oI_bef = torch.abs(o_bef)**2
-            oI_cap = Isum[:, :, i]
-
-            if torch.mean(oI_cap) > 0.1 and torch.mean(oI_bef) > 0.1:
-                o_aft = torch.sqrt(oI_cap) / torch.sqrt(oI_bef) * o_bef
-            else:
-                o_aft = o_bef
-
-            OP_aft = torch.fft.fftshift(torch.fft.fft2(o_aft))
-            OP_diff = OP_aft - OP_bef
+            log_callback("The compiled LED update runs on CUDA only; using the eager update on the CPU.")
+        compiled = False
+
+    # Coarse-to-fine: optional stages at lower upsample and with fewer LEDs run first
+    roi_size = min(roi_bounds(mat_data["imlow"].shape, roi_params)[2:])
+    stages = parse_schedule(system_params.get("schedule", ""), mat_data, roi_size, upsample, mode, tol, num_iters)
+    if init_object is not None and len(stages) > 1:
+        # A warm start is already at full resolution
+        stages = stages[-1:]
+    total_iters = sum(stage_iters for _, _, stage_iters in stages)
+
+    # Checkpoints hold everything the loop carries between iterations, so a
+    # resumed run continues exactly where the saved one stopped
+    checkpointing = checkpoint_path is not None and checkpoint_interval > 0
+    errors = []
+    state = load_checkpoint(checkpoint_path, device) if checkpointing else None
+    if state is not None and state.get("stages") != [list(stage) for stage in stages]:
+        state = None
+
+    def checkpoint(stage, next_iter):
+        save_checkpoint(checkpoint_path, {
+            "stages": [list(stage) for stage in stages], "stage": stage, "iteration": next_iter,
+            "O": O, "Pupil": torch.fft.fftshift(Pupil), "support": support,
+            "alpha": alpha, "beta": beta, "error_bef": error_bef, "errors": errors,
+            "scheduler": scheduler.state_dict() if scheduler is not None else {},
+            "zernike": projection.coefficients if projection is not None else torch.zeros(0),
+        })
+
+    O = None
+    projection = None
+    seeded_pupil = False
+    buffers = None
+    completed = True
+    stage_end = 0
+    for stage, (stage_upsample, stage_mode, stage_iters) in enumerate(stages):
+        stage_start, stage_end = stage_end, stage_end + stage_iters
+        if state is not None and state["stage"] > stage:
+            continue
+
+        with phase("precompute"):
+            pre = get_led_precomputation(mat_data, roi_params, stage_upsample, stage_mode, tol, device)
+        N_up = pre.N * stage_upsample
+        PupilSUM = pre.PupilSUM
+        # A digest of the PupilSUM support identifies the stage's LED geometry in checkpoints
+        support = hashlib.sha1(PupilSUM.real.cpu().numpy().tobytes()).hexdigest() if checkpointing else None
+
+        if O is None:
+            # Prepare tensors
+            O = pre.O_init.clone()
+            Pupil = pre.Pupil0.clone().to(torch.complex64)
+
+            # Warm start from a previous complex object (N*upsample square) and/or pupil (N square),
+            # e.g. an earlier result, a neighbouring tile or the previous timepoint
+            if init_object is not None:
+                o = torch.as_tensor(init_object, device=device).to(torch.complex64)
+                if o.shape == O.shape:
+                    # Inverse of the final ifft2(fftshift(O)), also for odd N * upsample
+                    O = torch.fft.ifftshift(torch.fft.fft2(o))
+                elif log_callback:
+                    log_callback(f"Initial object {tuple(o.shape)} does not match {tuple(O.shape)}; ignoring it.")
+            if init_pupil is not None:
+                P = torch.as_tensor(init_pupil, device=device).to(torch.complex64)
+                if P.shape == Pupil.shape:
+                    Pupil = torch.fft.ifftshift(P)
+                    seeded_pupil = True
+                elif log_callback:
+                    log_callback(f"Initial pupil {tuple(P.shape)} does not match {tuple(Pupil.shape)}; ignoring it.")
 
-            O[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2] = temp + alpha * OP_diff * \
-                torch.abs(Pupil) * torch.conj(Pupil) / torch.abs(Pupil).max() / \
-                (torch.abs(Pupil) ** 2 + 1) * torch.conj(Pupil0)
+            # Optional low-order Zernike model of the recovered pupil phase
+            if use_pupil_correction and zernike_order >= 2:
+                projection = ZernikeProjection(pre.Pupil0, zernike_order)
+        elif O.shape[0] != N_up:
+            O = _upsample_spectrum(O, N_up)
+        if len(stages) > 1 and log_callback:
+            log_callback(f"Stage {stage + 1}/{len(stages)}: upsample {stage_upsample}, {stage_mode} "
+                         f"({pre.ID_len} LEDs), {stage_iters} iterations.")
 
-            if use_pupil_correction:
-                Pupil += beta * OP_diff * torch.abs(OP_bef) * torch.conj(OP_bef) / \
-                    torch.abs(temp).max() / (torch.abs(OP_bef) ** 2 + 1000) * torch.conj(Pupil0)
-            else:
-                Pupil = Pupil0 * torch.exp(1j * torch.angle(Pupil))
+        # Optional fused LED update, compiled once per patch size
+        step = None
+        if compiled and not batched:
+            with phase("compile"):
+                step = compiled_led_step(pre.N, stage_upsample, device, use_pupil_correction, log_callback)
 
-            if iter == 0:
-                PupilSUM[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2] = Pupil0 + \
-                    PupilSUM[vo - N // 2:vo + N // 2, uo - N // 2:uo + N // 2] * (torch.ones_like(Pupil0) - Pupil0.abs())
-            else:
-                O *= PupilSUM
+        # Optional adaptive LED subsets; "all" visits every LED every iteration
+        scheduler = None if led_selection == "all" else \
+            LEDScheduler(pre, led_selection, led_fraction, led_tol)
 
-            error_now += torch.sum((torch.abs(o_bef) - torch.sqrt(oI_cap)) ** 2)
+        # Step sizes restart with every stage, since its LEDs and grid change the error scale
+        alpha, beta = alpha0, beta0
+        error_bef = 1e10
+        start_iter = stage_start
+        if state is not None and state["stage"] == stage and state["O"].shape == O.shape \
+                and state.get("support") == support:
+            O, Pupil = state["O"], torch.fft.ifftshift(state["Pupil"])
+            alpha, beta, error_bef = state["alpha"], state["beta"], state["error_bef"]
+            errors = list(state["errors"])
+            start_iter = state["iteration"]
+            if scheduler is not None and state.get("scheduler"):
+                scheduler.load_state_dict(state["scheduler"])
+            if projection is not None and len(state.get("zernike", ())) == len(projection.coefficients):
+                projection.coefficients = state["zernike"]
+            if error_callback:
+                for i, error in errors:
+                    error_callback(i, error)
+            if log_callback:
+                log_callback(f"Resuming from checkpoint at iteration {start_iter + 1}/{total_iters}.")
+        state = None
+        if use_pupil_correction:
+            weight = pre.update_weight(Pupil)
+        elif seeded_pupil:
+            # A seeded pupil keeps its phase in the forward model, so the update is weighted by it too
+            weight = pre.update_weight(pre.Pupil0_complex * torch.exp(1j * torch.angle(Pupil)))
+        else:
+            weight = pre.weight
 
-        if iter > 0 and (error_bef - error_now) / error_bef < 0.01:
-            alpha *= 0.5
-            beta *= 0.5
-            if alpha < 1e-4:
+        skipping = False
+        for iter in range(start_iter, stage_end):
+            if cancel_callback and cancel_callback():
+                if log_callback:
+                    log_callback(f"Cancelled before iteration {iter+1}/{total_iters}.")
+                if checkpointing and iter > start_iter:
+                    checkpoint(stage, iter)
+                completed = False
                 break
-        error_bef = error_now
+            if progress_callback:
+                progress_callback(int(100 * iter / total_iters))
+
+            leds = scheduler.select(iter - stage_start) if scheduler is not None else None
+            if leds is not None and not len(leds):
+                # Every LED has converged for now; the next refresh iteration revisits them all
+                if log_callback and not skipping:
+                    log_callback(f"No LED left to update after {iter}/{total_iters} iterations; "
+                                 f"waiting for the next refresh.")
+                skipping = True
+                continue
+            skipping = False
+            if log_callback:
+                visiting = f" ({len(leds)}/{pre.ID_len} LEDs)" if leds is not None else ""
+                log_callback(f"Iteration {iter+1}/{total_iters}{visiting}...")
+
+            with phase("iteration", iter=iter):
+                # Updates are weighted by conj(Pupil0), so they never write outside the
+                # PupilSUM support and no LED reads from outside it either. Masking once
+                # per iteration therefore gives the same O as masking after every LED.
+                # PupilSUM is precomputed, so the first pass of a stage leaves O unmasked.
+                if iter > stage_start:
+                    with phase("pupilsum_mask", iter=iter):
+                        O *= PupilSUM
+
+                stats = None if scheduler is None else {}
+                if batched:
+                    error_now, Pupil = _batched_iteration(
+                        O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, leds, stats)
+                else:
+                    if buffers is None or buffers.N != pre.N:
+                        buffers = WorkBuffers(pre.N, device)
+                    if step is not None:
+                        error_now, Pupil, weight = _compiled_iteration(
+                            O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, iter, step,
+                            leds, stats, buffers)
+                    else:
+                        error_now, Pupil, weight = _sequential_iteration(
+                            O, Pupil, weight, pre, alpha, beta, use_pupil_correction, phase, iter, leds, stats,
+                            buffers)
+                if scheduler is not None:
+                    scheduler.update(leds, stats["errors"], stats["changes"])
+                    error_now = scheduler.error()
+                if projection is not None:
+                    with phase("zernike_projection", iter=iter):
+                        Pupil = projection(Pupil)
+                        weight = pre.update_weight(Pupil)
+
+            if error_callback:
+                error_callback(iter, float(error_now))
+            if checkpointing:
+                errors.append([iter, float(error_now)])
+
+            # Between refreshes most LED errors are stale, so scheduled runs compare refresh iterations only
+            if scheduler is None or scheduler.is_refresh(iter - stage_start):
+                if iter > stage_start and (error_bef - error_now) / error_bef < 0.01:
+                    alpha *= 0.5
+                    beta *= 0.5
+                    if alpha < 1e-4:
+                        break
+                error_bef = error_now
+
+            if checkpointing and (iter + 1) % checkpoint_interval == 0 and iter + 1 < total_iters:
+                checkpoint(stage, iter + 1)
+
+        if not completed:
+            break
+
+    if checkpointing and completed:
+        remove_checkpoint(checkpoint_path)
+    # Back from the loop's native FFT order to the centered pupil callers expect
+    Pupil = torch.fft.fftshift(Pupil)
+    if use_pupil_correction and log_callback:
+        log_callback(f"Recovered pupil aberrations (rad): {describe(pupil_coefficients(Pupil.cpu().numpy()))}")
 
     # Final reconstruction
-    o = torch.fft.ifft2(torch.fft.fftshift(O))
-    AmpReconFPM = torch.abs(o)
-    PhaseReconFPM = torch.angle(o)
+    with phase("final_ifft"):
+        o = torch.fft.ifft2(torch.fft.fftshift(O))
+        AmpReconFPM = torch.abs(o)
+        PhaseReconFPM = torch.angle(o)
 
-    return AmpReconFPM, PhaseReconFPM, Pupil
\ No newline at end of file
+    return AmpReconFPM, PhaseReconFPM, Pupil
@@ -0,0 +1,51 @@
+"""
+Algorithm loading shared by the GUI, the full-field scheduler and the command line
+Each algorithm lives in Algorithms/<name>/ with a main_alg.py exposing
+run_algorithm and a config.yml describing its parameters
+"""
+
+import os
+import yaml
+
+ALGORITHM_DIRECTORY = "Algorithms"
+
+# Repository root, so configs resolve regardless of the working directory
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_algorithm(algorithm_name):
+    """Import Algorithms.<name>.main_alg and return its run_algorithm function."""
+    module_path = f"{ALGORITHM_DIRECTORY}.{algorithm_name}.main_alg"
+    run_module = __import__(module_path, fromlist=["run_algorithm"])
+    return getattr(run_module, "run_algorithm")
+
+
+def load_algorithm_config(algorithm_name):
+    """Return the parsed config.yml of an algorithm, or None if it has none."""
+    config_path = os.path.join(ROOT_DIRECTORY, ALGORITHM_DIRECTORY, algorithm_name, "config.yml")
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def convert_parameter(value, param_type):
+    """Convert a parameter value to the type declared in config.yml."""
+    if param_type == "int":
+        return int(value)
+    elif param_type == "float":
+        return float(value)
+    elif param_type == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in ["true", "1"]
+        return bool(value)
+    return value
+
+
+def default_parameters(algorithm_name):
+    """Return the default parameter values declared in an algorithm's config.yml."""
+    config = load_algorithm_config(algorithm_name) or {}
+    return {
+        key: convert_parameter(info.get("default"), info.get("type", "str"))
+        for key, info in config.get("parameters", {}).items()
+    }
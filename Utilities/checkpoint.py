@@ -0,0 +1,62 @@
+"""
+Reconstruction checkpoints for FPM Software
+Long runs periodically save their iteration state with torch.save so a run that
+was cancelled, closed or preempted resumes from its latest checkpoint
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import torch
+
+# Overridable through the environment, e.g. to keep checkpoints on a node's scratch disk
+CHECKPOINT_DIRECTORY = os.environ.get(
+    "FPM_CHECKPOINTS", os.path.join(os.path.expanduser("~"), ".cache", "fpm_software", "checkpoints"))
+
+
+def checkpoint_key(*parts):
+    """Stable hex key for a run described by JSON-serializable ``parts``."""
+    description = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+def checkpoint_path(key, directory=None):
+    """Checkpoint file for the run identified by ``key``."""
+    return os.path.join(directory or CHECKPOINT_DIRECTORY, f"{key}.pt")
+
+
+def save_checkpoint(path, state):
+    """Write ``state`` (tensors, numbers, lists) atomically, so a crash never leaves a partial file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path, device=None):
+    """Return the state saved at ``path`` on ``device``, or None if it is missing or unreadable."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        try:
+            return torch.load(path, map_location=device, weights_only=True)
+        except TypeError:
+            # torch < 1.13 has no weights_only; these files are written by save_checkpoint
+            return torch.load(path, map_location=device)
+    except (OSError, RuntimeError, ValueError, EOFError):
+        return None
+
+
+def remove_checkpoint(path):
+    """Delete a checkpoint once its run has completed."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,12 +1,38 @@
 import scipy.io
-import mat73
 import os
 
-from PySide6.QtWidgets import QFileDialog
+from Utilities.lazy_dataset import load_lazy_mat
+
+
+def read_mat_file(file_path, lazy=True):
+    """Read a .mat file into a dictionary and return it with the name of the reader used.
+
+    v7 and older files are read with scipy.io. v7.3 (HDF5) files are opened lazily
+    so that large stacks such as `imlow` are only read where they are indexed;
+    mat73 is used when `lazy` is False or the lazy reader fails.
+    """
+    try:
+        # Attempt to read with scipy.io (works for v7 and older .mat files)
+        return scipy.io.loadmat(file_path), "scipy.io"
+    except NotImplementedError:
+        pass
+
+    if lazy:
+        try:
+            return load_lazy_mat(file_path), "h5py (lazy)"
+        except Exception:
+            pass
+
+    # Fall back to mat73 (works for v7.3 files)
+    import mat73
+    return mat73.loadmat(file_path), "mat73"
 
 
 def load_mat_file(parent):
     """Opens a file dialog to select and load a .mat file, then displays messages in Msg_window."""
+    # Imported here so read_mat_file stays usable without Qt (e.g. from the command line)
+    from PySide6.QtWidgets import QFileDialog
+
     file_path, _ = QFileDialog.getOpenFileName(parent, "Select a .mat file", "", "MAT Files (*.mat);;All Files (*.*)")
 
     if not file_path:
@@ -18,17 +44,14 @@ def load_mat_file(parent):
     parent.ui.Msg_window.appendPlainText(f"Loading file: {os.path.basename(file_path)}")
 
     try:
-        # Attempt to read with scipy.io (works for v7 and older .mat files)
-        data = scipy.io.loadmat(file_path)
-        parent.ui.Msg_window.appendPlainText("File loaded successfully using scipy.io.")
-    except NotImplementedError:
-        # If scipy.io fails, try using mat73 (works for v7.3 files)
-        try:
-            data = mat73.loadmat(file_path)
-            parent.ui.Msg_window.appendPlainText("File loaded successfully using mat73.")
-        except Exception as e:
-            parent.ui.Msg_window.appendPlainText(f"Failed to load .mat file: {e}")
-            return None
+        data, reader = read_mat_file(file_path)
+        parent.ui.Msg_window.appendPlainText(f"File loaded successfully using {reader}.")
+    except Exception as e:
+        parent.ui.Msg_window.appendPlainText(f"Failed to load .mat file: {e}")
+        return None
 
-    parent.ui.Msg_window.appendPlainText("Data successfully loaded into memory.")
+    if reader.endswith("(lazy)"):
+        parent.ui.Msg_window.appendPlainText("Large variables are read from disk on demand.")
+    else:
+        parent.ui.Msg_window.appendPlainText("Data successfully loaded into memory.")
     return data  # Returns the loaded dictionary for further processing
@@ -1,9 +1,12 @@
-import time
 import numpy as np
 from PySide6.QtGui import QImage, QPixmap, QColor, QFont
-from PySide6.QtWidgets import QGraphicsScene, QGraphicsSimpleTextItem, QInputDialog, QApplication, QGraphicsView, QGraphicsTextItem
+from PySide6.QtWidgets import QGraphicsScene, QGraphicsPixmapItem, QGraphicsSimpleTextItem, QInputDialog, QGraphicsView, QGraphicsTextItem
 from PySide6.QtCore import Qt
 from Utilities.logging_utils import log_message
+from Utilities.frame_stats import get_frame_stats
+from Utilities.spectrum_cache import get_spectrum_cache
+from Utilities.image_utils import to_qimage, to_uint8
+from Utilities.tiled_image import image_item
 
 
 def mat2gray(image):
@@ -21,31 +24,41 @@ def compute_spectrum(image):
     return mat2gray(spectrum)
 
 
-def display_image(ui, image, frame_number=None, total_frames=None, title=None):
-    """Display an image in `display_window` with dynamic scaling and fixed-size frame number overlay."""
-    scene = QGraphicsScene()
+def display_image(ui, image, frame_number=None, total_frames=None, title=None, vmin=None, vmax=None):
+    """Display an image in `display_window` with dynamic scaling and fixed-size frame number overlay.
+
+    `vmin`/`vmax` give the normalization range, e.g. from the frame statistics
+    index; the image is scanned for them only when they are not given.
+    """
     height, width = image.shape
+    if image.size > 0 and (vmin is None or vmax is None):
+        vmin, vmax = image.min(), image.max()
 
     # Handle empty or invalid images
-    if image.size == 0 or np.all(image == 0):
+    if image.size == 0 or (vmin == 0 and vmax == 0):
         # Create a simple "No Image" placeholder
         q_image = QImage(width if width > 0 else 100, height if height > 0 else 100, QImage.Format_Grayscale8)
         q_image.fill(128)  # Gray background
-        pixmap = QPixmap.fromImage(q_image)
-    else:
-        # Normalize and convert image to 8-bit grayscale
-        image_min, image_max = image.min(), image.max()
-        if image_max > image_min:
-            image = (image - image_min) / (image_max - image_min) * 255
-        else:
-            image = np.zeros_like(image)
-        image = image.astype(np.uint8)
-        image = np.ascontiguousarray(image)  # Ensure C-contiguous memory
-
-        q_image = QImage(image.data, width, height, width, QImage.Format_Grayscale8)
-        pixmap = QPixmap.fromImage(q_image)
-    
-    pixmap_item = scene.addPixmap(pixmap)
+        return display_qimage(ui, q_image, frame_number, total_frames, title)
+
+    # Normalize to 8-bit grayscale; large images are drawn as tiles of a pyramid
+    return display_item(ui, image_item(image, vmin, vmax), frame_number, total_frames, title)
+
+
+def display_qimage(ui, q_image, frame_number=None, total_frames=None, title=None):
+    """Show an 8-bit QImage in a new scene with the frame and title overlays."""
+    return display_item(ui, QGraphicsPixmapItem(QPixmap.fromImage(q_image)), frame_number, total_frames, title)
+
+
+def display_item(ui, pixmap_item, frame_number=None, total_frames=None, title=None):
+    """Show an image graphics item in a new scene with the frame and title overlays.
+
+    Returns the image item and the frame number text item (None without a
+    frame number), so callers such as frame playback can update them in place.
+    """
+    scene = QGraphicsScene()
+    scene.addItem(pixmap_item)
+    text_item = None
 
     # Add frame number overlay with a fixed size
     if frame_number is not None and total_frames is not None:
@@ -81,6 +94,7 @@ def display_image(ui, image, frame_number=None, total_frames=None, title=None):
     # Enable zooming and dragging
     ui.display_window.setDragMode(QGraphicsView.ScrollHandDrag)
     ui.display_window.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+    return pixmap_item, text_item
 
 
 def display_single_raw_frame(main_window):
@@ -105,11 +119,13 @@ def display_single_raw_frame(main_window):
 
     if ok:
         main_window.ui.Msg_window.appendPlainText(f"Displaying frame {frame} of {num_frames}.")
-        display_image(main_window.ui, imlow[:, :, frame - 1], frame_number=frame-1, total_frames=num_frames)
+        image = np.asarray(imlow[:, :, frame - 1])
+        vmin, vmax = get_frame_stats(main_window).frame_range(frame - 1, image)
+        display_image(main_window.ui, image, frame_number=frame-1, total_frames=num_frames, vmin=vmin, vmax=vmax)
 
 
 def display_all_raw_frames(main_window):
-    """Display all raw images sequentially in `display_window` with a short delay."""
+    """Play all raw images in `display_window` without blocking the GUI."""
     if not hasattr(main_window, "mat_data") or main_window.mat_data is None:
         main_window.ui.Msg_window.appendPlainText("Error: No data loaded. Please load a .mat file first.")
         return
@@ -120,15 +136,15 @@ def display_all_raw_frames(main_window):
 
     imlow = main_window.mat_data["imlow"]
     num_frames = imlow.shape[2]
+    stats = get_frame_stats(main_window)
 
-    main_window.ui.Msg_window.appendPlainText(f"Displaying all {num_frames} frames sequentially.")
-
-    for i in range(num_frames):
-        main_window.ui.Msg_window.appendPlainText(f"Displaying frame {i + 1} of {num_frames}.")
-        display_image(main_window.ui, imlow[:, :, i], frame_number=i, total_frames=num_frames)
+    def render(i):
+        image = np.asarray(imlow[:, :, i])
+        return to_qimage(to_uint8(image, *stats.frame_range(i, image)))
 
-        QApplication.processEvents()  # Allow UI updates
-        time.sleep(0.1)  # Delay between frames
+    main_window.ui.Msg_window.appendPlainText(f"Displaying all {num_frames} frames sequentially.")
+    from Utilities.frame_player import start_playback  # Imports this module
+    start_playback(main_window, num_frames, render, imlow.shape[0] * imlow.shape[1], "All Raw Frames")
 
 
 def display_single_raw_spectrum(main_window):
@@ -153,12 +169,12 @@ def display_single_raw_spectrum(main_window):
 
     if ok:
         main_window.ui.Msg_window.appendPlainText(f"Displaying spectrum of frame {frame} of {num_frames}.")
-        spectrum = compute_spectrum(imlow[:, :, frame - 1])
-        display_image(main_window.ui, spectrum, frame_number=frame-1, total_frames=num_frames)
+        spectrum = get_spectrum_cache(main_window).spectrum(frame - 1)
+        display_qimage(main_window.ui, to_qimage(spectrum), frame_number=frame-1, total_frames=num_frames)
 
 
 def display_all_raw_spectra(main_window):
-    """Display all raw image spectra sequentially with a delay in `display_window`."""
+    """Play all raw image spectra in `display_window` without blocking the GUI."""
     if not hasattr(main_window, "mat_data") or main_window.mat_data is None:
         main_window.ui.Msg_window.appendPlainText("Error: No data loaded. Please load a .mat file first.")
         return
@@ -169,16 +185,14 @@ def display_all_raw_spectra(main_window):
 
     imlow = main_window.mat_data["imlow"]
     num_frames = imlow.shape[2]
+    spectra = get_spectrum_cache(main_window)
 
-    main_window.ui.Msg_window.appendPlainText(f"Displaying spectra of all {num_frames} frames sequentially.")
-
-    for i in range(num_frames):
-        main_window.ui.Msg_window.appendPlainText(f"Displaying spectrum of frame {i + 1} of {num_frames}.")
-        spectrum = compute_spectrum(imlow[:, :, i])
-        display_image(main_window.ui, spectrum, frame_number=i, total_frames=num_frames)
+    def render(i):
+        return to_qimage(spectra.spectrum(i))
 
-        QApplication.processEvents()  # Allow UI updates
-        time.sleep(0.1)  # Delay between frames
+    main_window.ui.Msg_window.appendPlainText(f"Displaying spectra of all {num_frames} frames sequentially.")
+    from Utilities.frame_player import start_playback  # Imports this module
+    start_playback(main_window, num_frames, render, imlow.shape[0] * imlow.shape[1], "All Raw Spectra")
 
 
 def display_single_roi_image(main_window):
@@ -206,7 +220,7 @@ def display_single_roi_image(main_window):
 
 
 def display_all_roi_images(main_window):
-    """Displays all ROI frames sequentially with a 0.1s delay."""
+    """Plays all ROI frames in `display_window` without blocking the GUI."""
     if not main_window.mat_data or "imlow" not in main_window.mat_data:
         log_message(main_window.ui, "Error: No data loaded.")
         return
@@ -222,14 +236,12 @@ def display_all_roi_images(main_window):
     roi_y = main_window.roi_params.get("y_offset", 1)
     roi_size = main_window.roi_params.get("roi_size", 256)
 
-    for i in range(num_frames):
-        roi_image = imlow[roi_y:roi_y + roi_size, roi_x:roi_x + roi_size, i]
-
-        log_message(main_window.ui, f"Displaying ROI frame {i+1} of {num_frames}.")
-        display_image(main_window.ui, roi_image, frame_number=i, total_frames=num_frames)
+    def render(i):
+        return to_qimage(to_uint8(np.asarray(imlow[roi_y:roi_y + roi_size, roi_x:roi_x + roi_size, i])))
 
-        QApplication.processEvents()
-        time.sleep(0.1)
+    log_message(main_window.ui, f"Displaying all {num_frames} ROI frames.")
+    from Utilities.frame_player import start_playback  # Imports this module
+    start_playback(main_window, num_frames, render, roi_size * roi_size, "All ROI Images")
 
 
 
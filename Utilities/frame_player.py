@@ -0,0 +1,210 @@
+"""
+Non-blocking frame playback for FPM Software
+A QTimer steps through a frame stack while a prefetch thread renders the
+upcoming frames into a bounded cache of 8-bit QImages
+Playback can be paused, scrubbed and stopped from a small control window
+"""
+
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QTimer, Qt, Signal
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QHBoxLayout, QLabel, QPushButton, QSlider, QSpinBox, QVBoxLayout, QWidget
+
+from Utilities.display_handler import display_qimage
+
+# Upper bound on cached 8-bit frames, in bytes
+CACHE_BYTES = 256 * 1024 ** 2
+
+
+class FramePlayer(QObject):
+    """Plays ``num_frames`` frames produced by ``render(index) -> QImage``.
+
+    ``render`` is called from the prefetch thread, so it must only touch
+    thread-safe objects (numpy arrays, QImage; not QPixmap or widgets). Frames
+    ahead of the current position are rendered into an LRU cache of at most
+    ``cache_frames`` entries; a frame that is not ready yet is rendered on the
+    GUI thread when it is due.
+    """
+
+    frame_changed = Signal(int)
+    state_changed = Signal(bool)  # True while playing
+
+    def __init__(self, ui, num_frames, render, frame_bytes, fps=20, lookahead=16, parent=None):
+        super().__init__(parent)
+        self.ui = ui
+        self.num_frames = num_frames
+        self.render = render
+        self.lookahead = lookahead
+        self.cache_frames = max(2 * lookahead, CACHE_BYTES // max(1, frame_bytes))
+        self.position = 0
+
+        self._cache = OrderedDict()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._scene = None
+        self._items = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._advance)
+        self.set_fps(fps)
+
+        self._thread = threading.Thread(target=self._prefetch_loop, name="FramePrefetch", daemon=True)
+        self._thread.start()
+
+    def is_playing(self):
+        return self.timer.isActive()
+
+    def set_fps(self, fps):
+        self.timer.setInterval(max(1, int(1000 / max(1, fps))))
+
+    def play(self):
+        if self.position >= self.num_frames - 1:
+            self.seek(0)
+        self.timer.start()
+        self.state_changed.emit(True)
+
+    def pause(self):
+        self.timer.stop()
+        self.state_changed.emit(False)
+
+    def toggle(self):
+        self.pause() if self.is_playing() else self.play()
+
+    def stop(self):
+        """Stop playback and the prefetch thread; the player cannot be restarted."""
+        self.timer.stop()
+        with self._condition:
+            self._stopped = True
+            self._cache.clear()
+            self._condition.notify_all()
+        self.state_changed.emit(False)
+
+    def seek(self, index):
+        """Show frame ``index`` now and prefetch from there."""
+        self.position = max(0, min(int(index), self.num_frames - 1))
+        with self._condition:
+            self._condition.notify_all()
+        self._show(self.position)
+
+    def _advance(self):
+        if self.position >= self.num_frames - 1:
+            self.pause()
+            return
+        self.seek(self.position + 1)
+
+    def _frame(self, index):
+        with self._condition:
+            q_image = self._cache.get(index)
+            if q_image is not None:
+                self._cache.move_to_end(index)
+                return q_image
+        # Not prefetched yet; render it here rather than skip it
+        q_image = self.render(index)
+        self._store(index, q_image)
+        return q_image
+
+    def _store(self, index, q_image):
+        with self._condition:
+            if self._stopped:
+                return
+            self._cache[index] = q_image
+            self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_frames:
+                self._cache.popitem(last=False)
+
+    def _show(self, index):
+        q_image = self._frame(index)
+        if self._scene is None or self.ui.display_window.scene() is not self._scene:
+            # First frame, or another view replaced the scene: build it once
+            self._items = display_qimage(self.ui, q_image, index, self.num_frames)
+            self._scene = self.ui.display_window.scene()
+        else:
+            pixmap_item, text_item = self._items
+            pixmap_item.setPixmap(QPixmap.fromImage(q_image))
+            text_item.setPlainText(f"Frame {index + 1}/{self.num_frames}")
+        self.frame_changed.emit(index)
+
+    def _next_missing(self):
+        """First frame in the lookahead window that is not cached, or None."""
+        stop = min(self.position + self.lookahead, self.num_frames)
+        for index in range(self.position, stop):
+            if index not in self._cache:
+                return index
+        return None
+
+    def _prefetch_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopped and self._next_missing() is None:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                index = self._next_missing()
+            self._store(index, self.render(index))
+
+
+class PlaybackWindow(QWidget):
+    """Play/pause, stop, frame slider and frame-rate controls for a FramePlayer."""
+
+    def __init__(self, player, title="Frame Playback"):
+        super().__init__()
+        self.setWindowTitle(title)
+        self.player = player
+
+        self.play_butt = QPushButton("Pause")
+        self.stop_butt = QPushButton("Stop")
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, player.num_frames - 1)
+        self.frame_label = QLabel(f"1/{player.num_frames}")
+        self.fps_spin = QSpinBox()
+        self.fps_spin.setRange(1, 60)
+        self.fps_spin.setValue(round(1000 / player.timer.interval()))
+        self.fps_spin.setSuffix(" fps")
+
+        self.play_butt.clicked.connect(player.toggle)
+        self.stop_butt.clicked.connect(self.close)
+        self.slider.sliderMoved.connect(player.seek)
+        self.fps_spin.valueChanged.connect(player.set_fps)
+        player.frame_changed.connect(self.on_frame_changed)
+        player.state_changed.connect(lambda playing: self.play_butt.setText("Pause" if playing else "Play"))
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.play_butt)
+        controls.addWidget(self.stop_butt)
+        controls.addWidget(self.fps_spin)
+        layout = QVBoxLayout()
+        layout.addWidget(self.slider)
+        layout.addWidget(self.frame_label)
+        layout.addLayout(controls)
+        self.setLayout(layout)
+
+    def on_frame_changed(self, index):
+        if not self.slider.isSliderDown():
+            self.slider.setValue(index)
+        self.frame_label.setText(f"{index + 1}/{self.player.num_frames}")
+
+    def closeEvent(self, event):
+        self.player.stop()
+        self.player.deleteLater()
+        super().closeEvent(event)
+
+
+def start_playback(main_window, num_frames, render, frame_bytes, title):
+    """Replace any running playback with a new player and control window and start it."""
+    stop_playback(main_window)
+    player = FramePlayer(main_window.ui, num_frames, render, frame_bytes, parent=main_window)
+    main_window.playback_window = PlaybackWindow(player, title)
+    main_window.playback_window.show()
+    player.seek(0)
+    player.play()
+    return player
+
+
+def stop_playback(main_window):
+    """Close the playback window of ``main_window``, if one is open."""
+    window = getattr(main_window, "playback_window", None)
+    if window is not None:
+        window.close()
+        main_window.playback_window = None
@@ -0,0 +1,118 @@
+"""
+Per-frame statistics index for FPM Software
+Records min, max, mean, percentiles and saturation counts of imlow frames as
+display paths first read them, so later views reuse them instead of rescanning
+frames; compute_frame_stats fills the whole index in one chunked pass
+"""
+
+import numpy as np
+
+# Percentiles stored per frame, e.g. for robust display contrast
+PERCENTILES = (1, 99)
+
+# Frames read per chunk, which bounds memory for lazy stacks
+CHUNK_BYTES = 256 * 1024 ** 2
+
+# Percentiles are estimated on at most this many pixels per frame
+PERCENTILE_SAMPLES = 128 * 128
+
+
+class FrameStats:
+    """Statistics of the frames of an (H, W, F) stack, as length-F arrays.
+
+    Frames are indexed on first use: ``frame_range`` reads a frame, or takes the
+    image a caller has already read, and records it, so loading a dataset reads
+    nothing. ``compute`` fills the remaining frames in bounded chunks.
+
+    ``minimum``, ``maximum``, ``mean`` and ``saturated`` are exact and NaN (-1
+    for ``saturated``) until a frame is indexed. ``percentiles`` maps each entry
+    of PERCENTILES to an array estimated on a strided pixel subsample.
+    ``saturated`` counts pixels at or above ``saturation_level``: the dtype
+    maximum for integer data, or the stack maximum for floating-point data,
+    which is only known once every frame is indexed.
+    """
+
+    def __init__(self, imlow, saturation_level=None):
+        self.imlow = imlow
+        H, W, F = imlow.shape
+        self.dtype = np.dtype(getattr(imlow, "dtype", np.float64))
+        if saturation_level is None and np.issubdtype(self.dtype, np.integer):
+            saturation_level = np.iinfo(self.dtype).max
+        self.saturation_level = saturation_level
+        self.step = max(1, int(np.ceil(np.sqrt(H * W / PERCENTILE_SAMPLES))))
+
+        self.minimum = np.full(F, np.nan)
+        self.maximum = np.full(F, np.nan)
+        self.mean = np.full(F, np.nan)
+        self.percentiles = {p: np.full(F, np.nan) for p in PERCENTILES}
+        self.saturated = np.full(F, -1, dtype=np.int64)
+        self.known = np.zeros(F, dtype=bool)
+
+    def __len__(self):
+        return len(self.mean)
+
+    def _record(self, start, block):
+        """Index the frames of an (H, W, n) ``block`` starting at frame ``start``."""
+        stop = start + block.shape[2]
+        self.minimum[start:stop] = block.min(axis=(0, 1))
+        self.maximum[start:stop] = block.max(axis=(0, 1))
+        self.mean[start:stop] = block.mean(axis=(0, 1), dtype="float64")
+        sample = block[::self.step, ::self.step, :].reshape(-1, stop - start)
+        for p, values in zip(PERCENTILES, np.percentile(sample, PERCENTILES, axis=0)):
+            self.percentiles[p][start:stop] = values
+        if self.saturation_level is not None:
+            self.saturated[start:stop] = np.count_nonzero(block >= self.saturation_level, axis=(0, 1))
+        self.known[start:stop] = True
+
+    def frame_range(self, frame, image=None):
+        """(min, max) of a frame, for display normalization.
+
+        ``image`` is the frame's (H, W) pixels if the caller has read them already.
+        """
+        if not self.known[frame]:
+            image = np.asarray(self.imlow[:, :, frame] if image is None else image)
+            self._record(frame, image[:, :, None])
+        return float(self.minimum[frame]), float(self.maximum[frame])
+
+    def compute(self):
+        """Index every frame not indexed yet, reading the stack in frame chunks."""
+        H, W, F = self.imlow.shape
+        chunk = max(1, CHUNK_BYTES // max(1, H * W * self.dtype.itemsize))
+        for start in range(0, F, chunk):
+            stop = min(start + chunk, F)
+            if not self.known[start:stop].all():
+                self._record(start, np.asarray(self.imlow[:, :, start:stop]))
+
+        if self.saturation_level is None:
+            # Floating-point data has no fixed ceiling; count pixels at the stack maximum
+            self.saturation_level = float(self.maximum.max()) if F else 0.0
+            self.saturated[:] = 0
+            for frame in np.flatnonzero(self.maximum >= self.saturation_level):
+                self.saturated[frame] = np.count_nonzero(np.asarray(self.imlow[:, :, frame]) >= self.saturation_level)
+        return self
+
+    def summary(self):
+        """One-line description for the message window, once every frame is indexed."""
+        saturated_frames = int(np.count_nonzero(self.saturated > 0))
+        return (f"Frame statistics: intensity {float(self.minimum.min()):.4g} to {float(self.maximum.max()):.4g}, "
+                f"mean {float(self.mean.mean()):.4g}, {int(self.saturated.sum())} saturated pixels "
+                f"in {saturated_frames} of {len(self)} frames")
+
+
+def compute_frame_stats(imlow, saturation_level=None):
+    """Build the complete FrameStats of an (H, W, F) stack, reading it in frame chunks."""
+    return FrameStats(imlow, saturation_level).compute()
+
+
+def get_frame_stats(owner):
+    """Return ``owner.frame_stats`` for ``owner.mat_data["imlow"]``, creating an empty index on first use.
+
+    The index lives on the owner (the main window), not in ``mat_data``, which
+    is passed to the algorithms and hashed by the result cache.
+    """
+    imlow = owner.mat_data["imlow"]
+    stats = getattr(owner, "frame_stats", None)
+    if not isinstance(stats, FrameStats) or stats.imlow is not imlow:
+        stats = FrameStats(imlow)
+        owner.frame_stats = stats
+    return stats
@@ -0,0 +1,221 @@
+"""
+Full-field tiled reconstruction for FPM Software
+Splits the raw stack into overlapping tiles, reconstructs them in a process pool
+and stitches amplitude and phase with feathered blending
+"""
+
+import os
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from Utilities.algorithm_loader import load_algorithm
+from Utilities.checkpoint import load_checkpoint, save_checkpoint
+
+# Scalar system parameters forwarded to every tile
+SYSTEM_KEYS = ("NA", "dpix_c", "lambda", "mag")
+
+
+def tile_starts(length, tile_size, overlap):
+    """Return tile start offsets covering [0, length), the last tile flush with the edge."""
+    if tile_size >= length:
+        return [0]
+    step = max(1, tile_size - overlap)
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
+def feather_window(size, overlap):
+    """2D blending weight that ramps linearly to zero across the overlap margins."""
+    ramp = np.ones(size, dtype="float32")
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype="float32") + 0.5) / overlap
+        ramp[:overlap] = edge
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    return np.outer(ramp, ramp)
+
+
+def _reconstruct_tile(algorithm_name, system_params, tile_data, y, x, num_threads, checkpoint_path=None, init=None):
+    """Process-pool worker: reconstruct one tile and return it as numpy arrays."""
+    import torch
+    torch.set_num_threads(num_threads)
+
+    run_algorithm = load_algorithm(algorithm_name)
+
+    # Only pass checkpointing and warm starts when used, so algorithms without them still run
+    extra = dict(init or {})
+    if checkpoint_path:
+        extra["checkpoint_path"] = checkpoint_path
+    tile_size = tile_data["imlow"].shape[0]
+    Amp, Phase, Pupil = run_algorithm(
+        system_params=system_params,
+        roi_params={"x_offset": 0, "y_offset": 0, "roi_size": tile_size},
+        mat_data=tile_data,
+        **extra
+    )
+    to_numpy = lambda t: t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+    return y, x, to_numpy(Amp), to_numpy(Phase), to_numpy(Pupil)
+
+
+def stitch_tiles(tiles, shape, overlap):
+    """Blend reconstructed tiles into one field.
+
+    Tiles are placed in raster order. Before blending, each tile's amplitude gain
+    and global phase offset are matched to the field stitched so far inside their
+    overlap. Phase is blended as a weighted unit phasor so wrapping never tears.
+    """
+    amp_acc = np.zeros(shape, dtype="float64")
+    phasor_acc = np.zeros(shape, dtype="complex128")
+    weight_acc = np.zeros(shape, dtype="float64")
+
+    for y, x, amp, phase in sorted(tiles, key=lambda t: (t[0], t[1])):
+        h, w = amp.shape
+        window = feather_window(h, overlap)
+        region = (slice(y, y + h), slice(x, x + w))
+        prior = weight_acc[region]
+
+        shared = prior * window
+        if shared.sum() > 0:
+            stitched_amp = amp_acc[region] / np.maximum(prior, 1e-12)
+            gain = np.sum(shared * stitched_amp) / max(np.sum(shared * amp), 1e-12)
+            offset = np.angle(np.sum(shared * phasor_acc[region] * np.exp(-1j * phase)))
+            amp = amp * gain
+            phase = phase + offset
+
+        amp_acc[region] += window * amp
+        phasor_acc[region] += window * np.exp(1j * phase)
+        weight_acc[region] += window
+
+    weight_acc = np.maximum(weight_acc, 1e-12)
+    return (amp_acc / weight_acc).astype("float32"), np.angle(phasor_acc).astype("float32")
+
+
+def _save_tile(path, result):
+    import torch
+    y, x, amp, phase, pupil = result
+    save_checkpoint(path, {"y": y, "x": x, "amplitude": torch.from_numpy(amp),
+                           "phase": torch.from_numpy(phase), "pupil": torch.from_numpy(pupil)})
+
+
+def _load_tile(path):
+    state = load_checkpoint(path, "cpu")
+    if state is None:
+        return None
+    return state["y"], state["x"], state["amplitude"].numpy(), state["phase"].numpy(), state["pupil"].numpy()
+
+
+def reconstruct_full_field(algorithm_name, system_params, mat_data, tile_size=256, overlap=32, workers=None,
+                           checkpoint_directory=None, init_object=None, init_pupil=None, pupil_library=None,
+                           log_callback=None, progress_callback=None, cancel_callback=None):
+    """Reconstruct the whole sensor field tile by tile across a process pool.
+
+    Returns the stitched amplitude and phase at the reconstruction resolution
+    together with the pupil recovered for the first tile. If ``cancel_callback``
+    returns True, pending tiles are dropped and None is returned once the tiles
+    already running have finished.
+
+    With a ``checkpoint_directory``, finished tiles and the iteration checkpoints
+    of running ones are kept there, so calling again with the same directory only
+    reconstructs what is missing. The directory is removed once the field is stitched.
+
+    ``init_object`` warm-starts every tile from its crop of a previous complex
+    field at the reconstruction resolution, e.g. the previous timepoint, and
+    ``init_pupil`` from a previous tile pupil.
+
+    Without ``init_pupil``, a ``pupil_library`` seeds each tile with the pupil
+    stored nearest to it. Runs with ``pupil_correction`` add every tile's
+    recovered pupil to the library; when it has none for these optics yet, one
+    tile is reconstructed first so the others start from its pupil.
+    """
+    imlow = mat_data["imlow"]
+    H, W, _ = imlow.shape
+    tile_size = min(tile_size, H, W)
+    overlap = min(overlap, tile_size // 2)
+    workers = max(1, workers or os.cpu_count() or 1)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    shared_data = {key: mat_data[key] for key in SYSTEM_KEYS if key in mat_data}
+    shared_data["NA_list"] = mat_data["NA_list"]
+
+    positions = [(y, x) for y in tile_starts(H, tile_size, overlap) for x in tile_starts(W, tile_size, overlap)]
+    if log_callback:
+        log_callback(f"Full field: {len(positions)} tiles of {tile_size}px on {workers} workers.")
+
+    if init_object is not None:
+        up = init_object.shape[0] // H
+        if up < 1 or init_object.shape != (H * up, W * up):
+            if log_callback:
+                log_callback(f"Initial object {init_object.shape} is not an upsampled {H}x{W} field; ignoring it.")
+            init_object = None
+
+    tile_path = lambda y, x, suffix: os.path.join(checkpoint_directory, f"tile-{y}-{x}{suffix}.pt")
+    results = []
+    if checkpoint_directory:
+        os.makedirs(checkpoint_directory, exist_ok=True)
+        results = [r for r in (_load_tile(tile_path(y, x, "")) for y, x in positions) if r is not None]
+        if results and log_callback:
+            log_callback(f"Resuming: {len(results)}/{len(positions)} tiles already reconstructed.")
+    finished = {(r[0], r[1]) for r in results}
+
+    tile_roi = lambda y, x: {"x_offset": x, "y_offset": y, "roi_size": tile_size}
+    store_pupils = pupil_library is not None and bool(system_params.get("pupil_correction"))
+    pending = [(y, x) for y, x in positions if (y, x) not in finished]
+    waves = [pending]
+    if store_pupils and init_pupil is None and len(pending) > 1 and \
+            pupil_library.nearest(mat_data, tile_roi(*pending[0])) is None:
+        waves = [pending[:1], pending[1:]]
+
+    def submit(pool, y, x):
+        tile_data = dict(shared_data)
+        tile_data["imlow"] = np.ascontiguousarray(imlow[y:y + tile_size, x:x + tile_size, :])
+        state_path = tile_path(y, x, "-state") if checkpoint_directory else None
+        init = {}
+        if init_object is not None:
+            init["init_object"] = np.ascontiguousarray(
+                init_object[y * up:(y + tile_size) * up, x * up:(x + tile_size) * up])
+        if init_pupil is not None:
+            init["init_pupil"] = init_pupil
+        elif pupil_library is not None:
+            prior = pupil_library.nearest(mat_data, tile_roi(y, x))
+            if prior is not None:
+                init["init_pupil"] = prior[0]
+        return pool.submit(_reconstruct_tile, algorithm_name, system_params,
+                           tile_data, y, x, num_threads, state_path, init)
+
+    # Spawned workers avoid forking a process that already runs Qt and torch threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for wave in waves:
+            futures = [submit(pool, y, x) for y, x in wave]
+            for future in as_completed(futures):
+                if cancel_callback and cancel_callback():
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    break
+                result = future.result()
+                results.append(result)
+                if checkpoint_directory:
+                    _save_tile(tile_path(result[0], result[1], ""), result)
+                if store_pupils:
+                    pupil_library.store(result[4], mat_data, tile_roi(result[0], result[1]),
+                                        {"algorithm": algorithm_name, "parameters": system_params})
+                if progress_callback:
+                    progress_callback(int(100 * len(results) / len(positions)))
+                if log_callback:
+                    log_callback(f"Tile {len(results)}/{len(positions)} reconstructed.")
+            if cancel_callback and cancel_callback():
+                break
+
+    if cancel_callback and cancel_callback():
+        return None
+
+    # Tile results come back upsampled; scale positions to match
+    upsample = results[0][2].shape[0] // tile_size
+    tiles = [(y * upsample, x * upsample, amp, phase) for y, x, amp, phase, _ in results]
+    Amp, Phase = stitch_tiles(tiles, (H * upsample, W * upsample), overlap * upsample)
+    first_pupil = min(results, key=lambda r: (r[0], r[1]))[4]
+    if checkpoint_directory:
+        shutil.rmtree(checkpoint_directory, ignore_errors=True)
+    return Amp, Phase, first_pupil
@@ -0,0 +1,23 @@
+"""
+8-bit image conversion shared by the display paths of FPM Software
+"""
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+
+def to_uint8(image, vmin=None, vmax=None):
+    """Normalize `image` from [vmin, vmax] (default: its own range) to a C-contiguous uint8 array."""
+    if vmin is None or vmax is None:
+        vmin, vmax = image.min(), image.max()
+    if vmax > vmin:
+        image = (image - vmin) / (vmax - vmin) * 255
+    else:
+        image = np.zeros_like(image)
+    return np.ascontiguousarray(image.astype(np.uint8))
+
+
+def to_qimage(image8):
+    """Wrap a 2D uint8 array in a QImage that owns a copy of the pixels (safe to pass between threads)."""
+    height, width = image8.shape
+    return QImage(image8.data, width, height, width, QImage.Format_Grayscale8).copy()
@@ -0,0 +1,124 @@
+"""
+Lazy loading of MATLAB v7.3 (HDF5) .mat files for FPM Software
+Large variables such as `imlow` are exposed as sliceable arrays that only read
+the frames and pixels actually indexed
+"""
+
+import numpy as np
+import h5py
+
+# Variables at least this large are opened lazily; smaller ones are read eagerly
+LAZY_THRESHOLD_BYTES = 64 * 1024 ** 2
+
+_NUMERIC_CLASSES = {
+    "double", "single", "int8", "int16", "int32", "int64",
+    "uint8", "uint16", "uint32", "uint64", "logical",
+}
+
+
+class LazyHDF5Array:
+    """Read-only view of a MATLAB HDF5 dataset in MATLAB axis order.
+
+    MATLAB writes arrays column-major, so a (H, W, frames) variable is stored as
+    (frames, W, H). Indexing is translated to the stored order and the result is
+    transposed back, so callers see the same layout as ``mat73.loadmat``.
+    """
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        self.shape = tuple(reversed(dataset.shape))
+        self.dtype = dataset.dtype
+        self.ndim = len(self.shape)
+        self.size = int(np.prod(self.shape))
+        self.nbytes = self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = next(i for i, k in enumerate(key) if k is Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        # Read each axis's bounding range from the file, then index that block in
+        # memory with an equivalent key, so numpy decides the result shape, also
+        # for integers mixed with index arrays. h5py accepts at most one index list.
+        read_key = []
+        block_key = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                read_key.append(k)
+                block_key.append(slice(None))
+            elif isinstance(k, (int, np.integer)):
+                i = int(k) + n if k < 0 else int(k)
+                if not 0 <= i < n:
+                    raise IndexError(f"index {k} is out of bounds for axis with size {n}")
+                read_key.append(slice(i, i + 1))
+                block_key.append(0)
+            else:
+                k = np.asarray(k)
+                if k.dtype == bool:
+                    k = np.flatnonzero(k)
+                k = np.where(k < 0, k + n, k).astype(np.intp)
+                if k.size and (k.min() < 0 or k.max() >= n):
+                    raise IndexError(f"index out of bounds for axis with size {n}")
+                start = int(k.min()) if k.size else 0
+                read_key.append(slice(start, int(k.max()) + 1 if k.size else 0))
+                block_key.append(k - start)
+
+        block = np.transpose(self._dataset[tuple(reversed(read_key))])
+        return block[tuple(block_key)]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        return data.astype(dtype) if dtype is not None else data
+
+    def astype(self, dtype):
+        """Read the whole array into memory as ``dtype``."""
+        return self[...].astype(dtype)
+
+
+def _memmap_dataset(file_path, dataset):
+    """Memory-map a contiguous, uncompressed dataset, or return None if it is chunked."""
+    if dataset.chunks is not None or dataset.compression is not None:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    stored = np.memmap(file_path, dtype=dataset.dtype, mode="r", offset=offset, shape=dataset.shape)
+    return stored.transpose()
+
+
+def load_lazy_mat(file_path):
+    """Open a v7.3 .mat file, reading small variables eagerly and large ones lazily.
+
+    Large contiguous variables are memory-mapped; chunked or compressed ones are
+    wrapped in a LazyHDF5Array. Non-numeric variables are skipped, except MATLAB
+    strings, which are decoded.
+    """
+    h5_file = h5py.File(file_path, "r")
+    data = {}
+    for name, dataset in h5_file.items():
+        if not isinstance(dataset, h5py.Dataset) or name.startswith("#"):
+            continue
+        matlab_class = dataset.attrs.get("MATLAB_class", b"double")
+        if isinstance(matlab_class, bytes):
+            matlab_class = matlab_class.decode()
+
+        if matlab_class == "char":
+            data[name] = "".join(chr(c) for c in np.asarray(dataset).ravel())
+        elif matlab_class not in _NUMERIC_CLASSES:
+            continue
+        elif dataset.size * dataset.dtype.itemsize >= LAZY_THRESHOLD_BYTES:
+            mapped = _memmap_dataset(file_path, dataset)
+            data[name] = mapped if mapped is not None else LazyHDF5Array(dataset)
+        else:
+            value = np.asarray(dataset).transpose()
+            data[name] = value.item() if value.size == 1 else value
+
+    # Keep the file open for as long as lazy variables may read from it
+    data["__h5file__"] = h5_file
+    return data
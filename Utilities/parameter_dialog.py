@@ -2,7 +2,7 @@ import os
 import yaml
 from PySide6.QtWidgets import (
     QWidget, QGroupBox, QLabel, QLineEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QMessageBox
+    QVBoxLayout, QHBoxLayout, QMessageBox, QScrollArea
 )
 from PySide6.QtCore import Qt
 
@@ -12,7 +12,7 @@ class ParameterDialog(QWidget):
         super().__init__(parent)
         self.setWindowTitle(f"{algorithm_name} Parameters")
         self.setWindowFlag(Qt.Window)  # Make it a floating window
-        self.setFixedSize(400, 300)
+        self.resize(520, 520)
 
         self.algorithm_name = algorithm_name
         self.config = self.load_config()
@@ -52,7 +52,11 @@ class ParameterDialog(QWidget):
             param_layout.addLayout(hlayout)
 
         self.param_box.setLayout(param_layout)
-        layout.addWidget(self.param_box)
+        # The rows scroll once there are more of them than the window holds
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(self.param_box)
+        layout.addWidget(scroll_area)
 
         confirm_button = QPushButton("Confirm")
         confirm_button.clicked.connect(self.confirm)
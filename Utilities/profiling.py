@@ -0,0 +1,121 @@
+"""
+Reconstruction profiling for FPM Software
+Collects the phase timings reported through run_algorithm's profile_callback and
+exports them as a Chrome trace (chrome://tracing, Perfetto) or a summary table
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class PhaseProfiler:
+    """Profile callback recording every ``(phase, start, duration, info)`` event.
+
+    Pass an instance as ``profile_callback`` to ``run_algorithm``. ``start`` is a
+    ``time.perf_counter()`` value and ``duration`` is in seconds; ``info`` holds
+    the iteration and LED indices the phase belongs to, if any.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, phase, start, duration, info=None):
+        with self._lock:
+            self.events.append((phase, start, duration, dict(info or {}), threading.get_ident()))
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    def wall_time(self):
+        """Seconds between the first phase start and the last phase end."""
+        if not self.events:
+            return 0.0
+        return max(s + d for _, s, d, _, _ in self.events) - min(s for _, s, _, _, _ in self.events)
+
+    def self_times(self):
+        """Duration of every event minus that of the events nested directly inside it.
+
+        Phases nest (an LED's ``gather`` runs inside its ``led`` phase, which runs
+        inside the ``iteration``), so summing raw durations counts time twice.
+        Nesting is found per thread from the event intervals.
+        """
+        self_time = [duration for _, _, duration, _, _ in self.events]
+        by_thread = {}
+        for index, (_, start, duration, _, tid) in enumerate(self.events):
+            by_thread.setdefault(tid, []).append((start, -duration, index))
+        for intervals in by_thread.values():
+            open_events = []
+            for start, negative_duration, index in sorted(intervals):
+                while open_events and open_events[-1][0] <= start:
+                    open_events.pop()
+                if open_events:
+                    self_time[open_events[-1][1]] -= -negative_duration
+                open_events.append((start - negative_duration, index))
+        return self_time
+
+    def summary(self):
+        """Per-phase count, total, self, mean and max seconds and self share of the wall time.
+
+        ``total`` includes nested phases and ``self`` excludes them, so the self
+        shares add up to at most 100%. Rows are sorted by self time, slowest first.
+        """
+        stats = OrderedDict()
+        for (phase, _, duration, _, _), self_time in zip(self.events, self.self_times()):
+            entry = stats.setdefault(phase, {"count": 0, "total": 0.0, "self": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += duration
+            entry["self"] += self_time
+            entry["max"] = max(entry["max"], duration)
+
+        wall = self.wall_time() or 1.0
+        rows = []
+        for phase, entry in stats.items():
+            rows.append({
+                "phase": phase,
+                "count": entry["count"],
+                "total": entry["total"],
+                "self": entry["self"],
+                "mean": entry["total"] / entry["count"],
+                "max": entry["max"],
+                "percent": 100.0 * entry["self"] / wall,
+            })
+        return sorted(rows, key=lambda row: row["self"], reverse=True)
+
+    def summary_table(self):
+        """Fixed-width text table of ``summary()`` for the message window."""
+        lines = [f"{'Phase':<22}{'Calls':>8}{'Total (s)':>12}{'Self (s)':>12}{'Mean (ms)':>12}{'Max (ms)':>12}"
+                 f"{'% wall':>9}"]
+        for row in self.summary():
+            lines.append(f"{row['phase']:<22}{row['count']:>8}{row['total']:>12.4f}{row['self']:>12.4f}"
+                         f"{row['mean'] * 1e3:>12.4f}{row['max'] * 1e3:>12.4f}{row['percent']:>9.1f}")
+        lines.append(f"Wall time: {self.wall_time():.4f} s (Total includes nested phases, % wall is self time)")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Events in the Chrome trace event format, as complete ('X') events in microseconds."""
+        origin = min((s for _, s, _, _, _ in self.events), default=0.0)
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": phase,
+                    "ph": "X",
+                    "ts": (start - origin) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": info,
+                }
+                for phase, start, duration, info, tid in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save_chrome_trace(self, file_path):
+        """Write the Chrome trace JSON to ``file_path``."""
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
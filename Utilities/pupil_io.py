@@ -0,0 +1,50 @@
+"""
+Pupil export for FPM Software
+Saves a recovered pupil with its Zernike coefficients so later runs on the same
+microscope can start from it, and reads pupils back from exports or result files
+"""
+
+import json
+import os
+
+import numpy as np
+
+from Utilities.zernike import pupil_coefficients
+
+# Radial order of the Zernike coefficients stored alongside an exported pupil
+EXPORT_ZERNIKE_ORDER = 6
+
+
+def save_pupil(path, pupil, metadata=None):
+    """Write ``pupil`` to .npz (with Zernike coefficients and metadata) or .npy."""
+    pupil = np.asarray(pupil, dtype="complex64")
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npz":
+        np.savez_compressed(path, pupil=pupil, zernike=pupil_coefficients(pupil, EXPORT_ZERNIKE_ORDER),
+                            metadata=json.dumps(metadata or {}, default=str))
+    elif extension == ".npy":
+        np.save(path, pupil)
+    else:
+        raise ValueError(f"Unsupported pupil format '{extension}' (use .npz or .npy)")
+
+
+def load_pupil(path):
+    """Complex pupil from a save_pupil export or a .h5/.npz/.mat result file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.load(path)
+    if extension in (".h5", ".hdf5"):
+        import h5py
+        with h5py.File(path, "r") as f:
+            pupil = f["pupil"][()] if "pupil" in f else None
+    elif extension == ".npz":
+        with np.load(path) as f:
+            pupil = f["pupil"] if "pupil" in f else None
+    elif extension == ".mat":
+        import scipy.io
+        pupil = scipy.io.loadmat(path).get("pupil")
+    else:
+        raise ValueError(f"Unsupported pupil format '{extension}' (use .npz, .npy, .h5 or .mat)")
+    if pupil is None:
+        raise ValueError(f"No pupil found in {path}")
+    return np.asarray(pupil, dtype="complex64")
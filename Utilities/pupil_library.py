@@ -0,0 +1,179 @@
+"""
+Pupil prior library for FPM Software
+Keeps recovered pupils keyed by objective NA, wavelength, magnification and field
+position, so later runs on the same microscope start from the nearest one
+Least recently used pupils are evicted once the library exceeds its size limit
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from Utilities.roi_data import roi_bounds
+from Utilities.zernike import pupil_coefficients, zernike_basis, zernike_phase
+
+# Overridable through the environment, e.g. to share one library between workstations
+LIBRARY_DIRECTORY = os.environ.get(
+    "FPM_PUPIL_LIBRARY", os.path.join(os.path.expanduser("~"), ".cache", "fpm_software", "pupils"))
+LIBRARY_MAX_BYTES = int(float(os.environ.get("FPM_PUPIL_LIBRARY_MB", 256)) * 1024 ** 2)
+
+# Radial order of the Zernike coefficients kept with each pupil, used to
+# render it on a pupil grid of another size
+LIBRARY_ZERNIKE_ORDER = 6
+
+# Optics that must match for a pupil to be reused, with their defaults
+_OPTICS_KEYS = (("NA", 0.1), ("lambda", 0.5), ("mag", 10.0))
+
+
+def optics_of(mat_data):
+    """Objective NA, wavelength and magnification of a dataset."""
+    scalar = lambda key, default: float(np.asarray(mat_data.get(key, default), dtype="float64").ravel()[0])
+    return {key: scalar(key, default) for key, default in _OPTICS_KEYS}
+
+
+def field_position(mat_data, roi_params):
+    """Camera pixel at the center of an ROI, placed and clipped as the algorithms read it."""
+    y, x, height, width = roi_bounds(mat_data["imlow"].shape, roi_params)
+    return x + width / 2, y + height / 2
+
+
+def pupil_support(mat_data, size):
+    """Binary pupil of a dataset on the size x size frequency grid the algorithms use."""
+    optics = optics_of(mat_data)
+    dpix = float(np.asarray(mat_data.get("dpix_c", 3.45), dtype="float64").ravel()[0]) / optics["mag"]
+    k = np.arange(-size / 2, size / 2) / (size * dpix) * 2 * np.pi
+    kxx, kyy = np.meshgrid(k, k)
+    return (kxx ** 2 + kyy ** 2 <= (optics["NA"] * 2 * np.pi / optics["lambda"]) ** 2).astype("float32")
+
+
+class PupilLibrary:
+    """Directory of ``<key>.npz`` pupils, one per optics, field position and pupil size.
+
+    Storing a pupil for the same optics, position and size replaces the previous one.
+    Recency is tracked through file modification times, which ``nearest`` refreshes,
+    and entries beyond ``max_bytes`` are evicted least recently used first. The
+    metadata of each file is read once and indexed by inode and size, so looking
+    up a pupil per tile only lists the directory.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or LIBRARY_DIRECTORY
+        self.max_bytes = LIBRARY_MAX_BYTES if max_bytes is None else max_bytes
+        self._index = {}
+
+    def _path(self, optics, position, size):
+        description = json.dumps([optics, [round(v, 1) for v in position], size], sort_keys=True)
+        return os.path.join(self.directory, f"{hashlib.blake2b(description.encode(), digest_size=20).hexdigest()}.npz")
+
+    def store(self, pupil, mat_data, roi_params, metadata=None):
+        """Add the pupil recovered on ``roi_params`` of ``mat_data``; returns its path."""
+        pupil = np.asarray(pupil, dtype="complex64")
+        optics = optics_of(mat_data)
+        position = field_position(mat_data, roi_params)
+        path = self._path(optics, position, pupil.shape[0])
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, pupil=pupil, size=np.asarray(pupil.shape[0]),
+                         zernike=pupil_coefficients(pupil, LIBRARY_ZERNIKE_ORDER),
+                         optics=np.asarray(json.dumps(optics)), position=np.asarray(position),
+                         created=np.asarray(time.time()), metadata=np.asarray(json.dumps(metadata or {}, default=str)))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+        return path
+
+    def _files(self):
+        """(path, stat) of every stored pupil, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((path, os.stat(path)))
+            except OSError:
+                continue
+        return sorted(files, key=lambda file: file[1].st_mtime)
+
+    def entries(self):
+        """(path, optics, position, size) of every stored pupil."""
+        entries = []
+        index = {}
+        for path, stat in sorted(self._files()):
+            # A replaced file has a new inode, while nearest's utime keeps it
+            version = (stat.st_ino, stat.st_size)
+            cached = self._index.get(path)
+            if cached is not None and cached[0] == version:
+                entry = cached[1]
+            else:
+                try:
+                    # Only the small metadata members are read; older entries lack "size"
+                    with np.load(path, allow_pickle=False) as f:
+                        size = int(f["size"]) if "size" in f.files else f["pupil"].shape[0]
+                        entry = (path, json.loads(str(f["optics"])), tuple(f["position"]), size)
+                except (OSError, KeyError, ValueError):
+                    continue
+            index[path] = (version, entry)
+            entries.append(entry)
+        self._index = index
+        return entries
+
+    def nearest(self, mat_data, roi_params, size=None):
+        """Pupil prior for an ROI as ``(pupil, position)``, or None if no entry has these optics.
+
+        Picks the entry with matching optics closest in field position. A pupil of
+        another size is rendered from its Zernike coefficients on this ROI's
+        ``size`` x ``size`` pupil grid (``roi_size`` by default).
+        """
+        optics = optics_of(mat_data)
+        position = field_position(mat_data, roi_params)
+        size = size or roi_params.get("roi_size", 256)
+        matches = [entry for entry in self.entries()
+                   if all(np.isclose(entry[1].get(key, np.nan), value, rtol=1e-3) for key, value in optics.items())]
+        if not matches:
+            return None
+        # Closest in the field, then the same pupil size
+        path, _, stored_position, stored_size = min(
+            matches, key=lambda e: (np.hypot(e[2][0] - position[0], e[2][1] - position[1]), e[3] != size))
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                pupil, coefficients = f["pupil"], f["zernike"]
+            os.utime(path)  # Mark as recently used
+        except (OSError, KeyError, ValueError):
+            return None
+        if stored_size != size:
+            support = pupil_support(mat_data, size)
+            pupil = (support * np.exp(1j * zernike_phase(coefficients, zernike_basis(support, LIBRARY_ZERNIKE_ORDER))))
+        return pupil.astype("complex64"), stored_position
+
+    def evict(self):
+        """Remove least recently used pupils until the library fits in ``max_bytes``."""
+        files = self._files()
+        total = sum(stat.st_size for _, stat in files)
+        for path, stat in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+
+    def clear(self):
+        """Delete every stored pupil."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._index = {}
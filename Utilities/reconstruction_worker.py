@@ -0,0 +1,64 @@
+"""
+Background reconstruction worker for FPM Software
+Runs a reconstruction off the GUI thread and reports progress, log messages and
+results back through Qt signals
+"""
+
+import threading
+
+from PySide6.QtCore import QObject, QThread, Qt, Signal
+
+
+class ReconstructionWorker(QObject):
+    """Runs ``task(log_callback, progress_callback, cancel_callback)`` on a QThread.
+
+    The task's return value is emitted through ``finished``, exceptions through
+    ``failed``. ``cancel`` only sets a flag; the task polls ``cancel_callback``
+    between iterations and returns early, after which ``cancelled`` is emitted.
+    """
+
+    progress = Signal(int)
+    log = Signal(str)
+    finished = Signal(object)
+    failed = Signal(object)
+    cancelled = Signal()
+    done = Signal()
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self._cancel_event = threading.Event()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            result = self.task(self.log.emit, self.progress.emit, self.is_cancelled)
+        except BaseException as e:
+            self.failed.emit(e)
+        else:
+            if self.is_cancelled():
+                self.cancelled.emit()
+            else:
+                self.finished.emit(result)
+        finally:
+            self.done.emit()
+
+
+def start_worker(worker):
+    """Move ``worker`` to a new QThread, start it and return the thread.
+
+    The thread quits once the worker emits ``done``. Keep references to both
+    objects until ``thread.wait()`` has returned.
+    """
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    # Direct connection so the thread can stop even while the GUI thread waits on it
+    worker.done.connect(thread.quit, Qt.DirectConnection)
+    thread.start()
+    return thread
@@ -0,0 +1,313 @@
+"""
+Pre-run resource estimation for FPM Software
+Predicts the peak memory and runtime of a single-ROI reconstruction from the ROI
+size, LED count, upsampling, iterations and measured FFT throughput, and shrinks
+the run to fit the available memory before anything is allocated
+"""
+
+import json
+import math
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+import psutil
+import torch
+
+from Utilities.roi_data import roi_bounds
+
+# Fraction of the available memory a run may plan to use
+MEMORY_HEADROOM = 0.8
+
+# Smallest ROI the guardrails will shrink to, in pixels
+MIN_ROI_SIZE = 64
+
+# Measured per-LED update cost, by device and loop, and the synthetic datasets it is timed on.
+# Measurements are kept on disk so later processes skip the benchmark
+THROUGHPUT_FILE = os.environ.get(
+    "FPM_THROUGHPUT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "fpm_software", "throughput.json"))
+_THROUGHPUT = {}
+_THROUGHPUT_LOCK = threading.Lock()
+_BENCHMARK_SIZES = (32, 256)
+_BENCHMARK_LEDS = 5  # LEDs per side of the square LED grid
+
+# Parameters that select the timed LED loop, with their defaults
+_LOOP_PARAMETERS = (("batched", False), ("pupil_correction", False), ("zernike_order", 4))
+
+_COMPLEX = 8  # complex64
+_FLOAT = 4  # float32
+
+
+def format_bytes(n):
+    """Human-readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+class ResourceEstimate:
+    """Predicted cost of one reconstruction.
+
+    ``components`` maps a description to its bytes; ``peak_bytes`` adds the
+    largest of the precomputation, iteration and final temporaries to the
+    resident arrays, since each group is freed before the next one.
+    """
+
+    def __init__(self, components, peak_bytes, runtime_s, num_leds, roi_size, upsample):
+        self.components = components
+        self.peak_bytes = peak_bytes
+        self.runtime_s = runtime_s
+        self.num_leds = num_leds
+        self.roi_size = roi_size
+        self.upsample = upsample
+
+    def summary(self):
+        """One-line description for the message window."""
+        return (f"Estimated peak memory {format_bytes(self.peak_bytes)} and runtime ~{self.runtime_s:.1f} s "
+                f"({self.num_leds} LEDs, {self.roi_size} px ROI, upsample {self.upsample})")
+
+
+def _default_device(device=None):
+    return torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+
+
+def available_memory(device=None):
+    """Bytes the reconstruction can allocate on ``device`` (the run's default device if None)."""
+    device = _default_device(device)
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+    return psutil.virtual_memory().available
+
+
+def check_memory(estimate, budget=None, device=None):
+    """Raise MemoryError if ``estimate`` does not fit ``budget`` bytes.
+
+    The default budget is MEMORY_HEADROOM of the memory available on ``device``.
+    """
+    if budget is None:
+        budget = MEMORY_HEADROOM * available_memory(device)
+    if estimate.peak_bytes > budget:
+        raise MemoryError(f"{estimate.summary()} exceeds the {format_bytes(budget)} memory budget")
+
+
+def _selected_na(mat_data, mode, tol):
+    """Illumination NA rows the algorithm keeps for ``mode``, as in its LED selection."""
+    NA_list = np.asarray(mat_data["NA_list"], dtype="float64")
+    NA = float(np.asarray(mat_data.get("NA", 0.1), dtype="float64").ravel()[0])
+    NAillu = np.hypot(NA_list[:, 0], NA_list[:, 1])
+    if mode == "bright":
+        return NA_list[NAillu <= NA + tol]
+    if mode == "dark":
+        return NA_list[NAillu > NA + tol]
+    return NA_list
+
+
+def minimum_upsample(mat_data, roi_size, mode, tol):
+    """Smallest upsampling whose spectrum still holds every selected LED's pupil."""
+    NA_list = _selected_na(mat_data, mode, tol)
+    if not len(NA_list) or roi_size <= 0:
+        return 1
+    scalar = lambda key, default: float(np.asarray(mat_data.get(key, default), dtype="float64").ravel()[0])
+    dpix = scalar("dpix_c", 3.45) / scalar("mag", 10.0)
+    wavelength = scalar("lambda", 0.5)
+    # An LED shifts its pupil by NA * N * dpix / lambda pixels from the spectrum center
+    shift = float(np.abs(NA_list).max()) * roi_size * dpix / wavelength
+    return max(1, math.ceil((roi_size + 2 * shift + 2) / roi_size))
+
+
+def _hardware(device):
+    """Description of the hardware behind ``device``, so stored measurements follow the machine."""
+    device = torch.device(device)
+    if device.type == "cuda":
+        name = torch.cuda.get_device_name(device)
+    else:
+        name = f"{platform.processor() or platform.machine()} x{torch.get_num_threads()}"
+    return f"{device.type}: {name}, torch {torch.__version__}"
+
+
+def _load_throughput():
+    """Stored measurements by key, or an empty dict if the file is missing or unreadable."""
+    try:
+        with open(THROUGHPUT_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_throughput(key, value):
+    """Add one measurement to the stored ones; the file is replaced atomically."""
+    stored = _load_throughput()
+    stored[key] = list(value)
+    tmp_path = f"{THROUGHPUT_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(THROUGHPUT_FILE)), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, THROUGHPUT_FILE)
+    except OSError:
+        # A read-only cache only costs a benchmark in the next process
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def measure_throughput(device, system_params=None, algorithm_name="Gerchberg-Saxton"):
+    """Per-LED update cost as ``(overhead_s, seconds per n^2 log2 n^2)``, timed once per device and loop.
+
+    Runs the algorithm's own ``run_algorithm`` on synthetic datasets of two ROI
+    sizes and times its iterations between error callbacks, which gives the
+    fixed per-update overhead (kernel launches, Python dispatch) and the
+    FFT-dominated size-dependent cost. The batched loop and pupil recovery in
+    ``system_params`` are timed as configured; compiled runs are timed on the
+    eager update, an upper bound, since compiling for the benchmark sizes would
+    take longer than the run it estimates.
+
+    Measurements are stored in THROUGHPUT_FILE by hardware, torch version,
+    algorithm config version and loop, and reused by later processes.
+    """
+    from Utilities.algorithm_loader import default_parameters, load_algorithm, load_algorithm_config
+    from Utilities.synthetic_data import simulate_fpm_dataset
+
+    system_params = system_params or {}
+    loop = {key: system_params.get(key, default) for key, default in _LOOP_PARAMETERS}
+    version = (load_algorithm_config(algorithm_name) or {}).get("version", 0)
+    key = json.dumps([_hardware(device), algorithm_name, version, sorted(loop.items())])
+    with _THROUGHPUT_LOCK:
+        if key not in _THROUGHPUT:
+            stored = _load_throughput().get(key)
+            if stored is not None:
+                _THROUGHPUT[key] = tuple(stored)
+        if key not in _THROUGHPUT:
+            run_algorithm = load_algorithm(algorithm_name)
+            params = dict(default_parameters(algorithm_name), **loop, mode="all", upsample=2, num_iters=3,
+                          schedule="", checkpoint_interval=0, led_selection="all", compiled=False)
+
+            def time_update(n):
+                mat_data, _ = simulate_fpm_dataset(roi_size=n, n_leds=_BENCHMARK_LEDS, upsample=2, device=device)
+                ends = []
+                run_algorithm(params, {"x_offset": 0, "y_offset": 0, "roi_size": n}, mat_data,
+                              error_callback=lambda i, error: ends.append(time.perf_counter()))
+                # The first iteration also pays for one-off allocations
+                return float(np.median(np.diff(ends))) / _BENCHMARK_LEDS ** 2
+
+            small, large = _BENCHMARK_SIZES
+            t_small, t_large = time_update(small), time_update(large)
+            w_small, w_large = (n * n * math.log2(n * n) for n in _BENCHMARK_SIZES)
+            per_work = max(0.0, (t_large - t_small) / (w_large - w_small))
+            _THROUGHPUT[key] = (max(0.0, t_small - per_work * w_small), per_work)
+            _store_throughput(key, _THROUGHPUT[key])
+        return _THROUGHPUT[key]
+
+
+def estimate_resources(system_params, roi_params, mat_data, device=None):
+    """Predict the peak memory and runtime of ``run_algorithm`` for these inputs."""
+    device = _default_device(device)
+    imlow = mat_data["imlow"]
+    itemsize = np.dtype(getattr(imlow, "dtype", np.float64)).itemsize
+
+    # The algorithm crops at the stack edge, so the ROI can be smaller than requested
+    _, _, height, width = roi_bounds(imlow.shape, roi_params)
+    N = min(height, width)
+    upsample = int(system_params.get("upsample", 3))
+    num_iters = int(system_params.get("num_iters", 50))
+    batched = bool(system_params.get("batched", False))
+    L = len(_selected_na(mat_data, system_params.get("mode", "all"), float(system_params.get("tol", 0.05))))
+    N_up = N * upsample
+    patch = N * N
+    spectrum = N_up * N_up
+
+    # Resident through the run: normalized sqrt stack, O and its initial guess,
+    # coverage, PupilSUM and the final amplitude/phase. The algorithm keeps the
+    # precomputed part cached after the run; earlier runs' entries are already
+    # out of available_memory() and bounded by the algorithm's cache budget
+    resident = {
+        "LED intensity stack": L * patch * _FLOAT,
+        "object spectrum (O, initial guess, PupilSUM)": 3 * spectrum * _COMPLEX,
+        "coverage and results": 3 * spectrum * _FLOAT,
+    }
+    # Freed after precomputation: the upsampled initial guess and, for lazy HDF5
+    # stacks, the raw ROI block read before conversion
+    precompute = {"initial guess": spectrum * (_FLOAT + 2 * _COMPLEX)}
+    if not isinstance(imlow, np.ndarray):
+        precompute["lazy ROI read"] = L * patch * itemsize
+    # Per-iteration temporaries: about ten (ID_len, N, N) complex stacks when batched,
+    # plus a full-size step; sequential runs keep a handful of N x N arrays
+    if batched:
+        iteration = {"batched LED temporaries": 10 * L * patch * _COMPLEX + spectrum * _COMPLEX}
+    else:
+        iteration = {"per-LED temporaries": 10 * patch * _COMPLEX}
+    final = {"final inverse FFT": 2 * spectrum * _COMPLEX}
+
+    resident_bytes = sum(resident.values())
+    peak_bytes = resident_bytes + max(sum(precompute.values()), sum(iteration.values()), sum(final.values()))
+    components = {**resident, **precompute, **iteration, **final}
+
+    overhead, per_work = measure_throughput(device, system_params)
+    per_led = overhead + per_work * patch * math.log2(max(2, patch))
+    # Coarse schedule stages cost the same per LED update, whatever their upsample
+    tol = float(system_params.get("tol", 0.05))
+    led_updates = num_iters * L
+    for stage in filter(None, (part.strip() for part in str(system_params.get("schedule") or "").split(","))):
+        fields = [field.strip() for field in stage.split(":")]
+        if len(fields) == 3 and fields[2].isdigit():
+            led_updates += int(fields[2]) * len(_selected_na(mat_data, fields[1], tol))
+    runtime_s = led_updates * per_led
+    return ResourceEstimate(components, peak_bytes, runtime_s, L, N, upsample)
+
+
+def fit_to_memory(system_params, roi_params, mat_data, budget=None, device=None):
+    """Shrink a run until its estimate fits ``budget`` bytes.
+
+    Tries, in order, the sequential LED loop instead of the batched one, lower
+    upsampling (down to ``minimum_upsample``), then a smaller centered ROI. Returns ``(system_params, roi_params,
+    estimate, changes)`` with new dicts and a list of human-readable changes.
+    Raises MemoryError if even the smallest run does not fit.
+    """
+    if budget is None:
+        budget = MEMORY_HEADROOM * available_memory(device)
+    system_params = dict(system_params)
+    roi_params = dict(roi_params)
+    changes = []
+
+    estimate = estimate_resources(system_params, roi_params, mat_data, device)
+    if estimate.peak_bytes <= budget:
+        return system_params, roi_params, estimate, changes
+
+    if system_params.get("batched"):
+        system_params["batched"] = False
+        changes.append("batched -> sequential LED updates")
+        estimate = estimate_resources(system_params, roi_params, mat_data, device)
+
+    upsample = int(system_params.get("upsample", 3))
+    original_upsample = upsample
+    lowest = minimum_upsample(mat_data, estimate.roi_size, system_params.get("mode", "all"),
+                              float(system_params.get("tol", 0.05)))
+    while estimate.peak_bytes > budget and upsample > lowest:
+        upsample -= 1
+        system_params["upsample"] = upsample
+        estimate = estimate_resources(system_params, roi_params, mat_data, device)
+    if upsample != original_upsample:
+        changes.append(f"upsample {original_upsample} -> {upsample}")
+
+    # Start from the offsets the algorithm would use, which default to a centered ROI
+    y, x, _, _ = roi_bounds(mat_data["imlow"].shape, roi_params)
+    roi_params["x_offset"], roi_params["y_offset"] = x, y
+    roi_size = int(roi_params.get("roi_size", 256))
+    original_roi_size = roi_size
+    while estimate.peak_bytes > budget and roi_size // 2 >= MIN_ROI_SIZE:
+        # Halve around the same center so the region of interest stays in view
+        quarter = roi_size // 4
+        roi_size //= 2
+        roi_params["x_offset"] += quarter
+        roi_params["y_offset"] += quarter
+        roi_params["roi_size"] = roi_size
+        estimate = estimate_resources(system_params, roi_params, mat_data, device)
+    if roi_size != original_roi_size:
+        changes.append(f"ROI {original_roi_size} -> {roi_size} px")
+
+    check_memory(estimate, budget)
+    return system_params, roi_params, estimate, changes
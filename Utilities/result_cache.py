@@ -0,0 +1,169 @@
+"""
+On-disk reconstruction result cache for FPM Software
+Stores amplitude, phase, pupil and convergence history keyed by a content hash
+of the ROI data and NA_list plus the ROI, algorithm, config version and parameters
+Least recently used entries are evicted once the cache exceeds its size limit
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from Utilities.algorithm_loader import load_algorithm_config
+
+# Overridable through the environment, e.g. for shared compute nodes
+CACHE_DIRECTORY = os.environ.get(
+    "FPM_RESULT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "fpm_software", "results"))
+CACHE_MAX_BYTES = int(float(os.environ.get("FPM_RESULT_CACHE_MB", 1024)) * 1024 ** 2)
+
+# Scalar optics that change the reconstruction of the same pixels
+_SYSTEM_KEYS = ("NA", "lambda", "dpix_c", "mag")
+
+# Parameters that do not change the result, left out of cache keys
+_UNKEYED_PARAMETERS = ("checkpoint_interval",)
+
+
+def dataset_digest(mat_data, roi_params):
+    """BLAKE2 digest of the ROI crop of imlow, NA_list and the system scalars."""
+    imlow = mat_data["imlow"]
+    H, W, _ = imlow.shape
+    cx = roi_params.get("x_offset", W // 2)
+    cy = roi_params.get("y_offset", H // 2)
+    roi_size = roi_params.get("roi_size", 256)
+
+    digest = hashlib.blake2b(digest_size=20)
+    # Only the ROI is hashed, so lazy stacks read no more than the reconstruction does
+    crop = np.ascontiguousarray(imlow[cy:cy + roi_size, cx:cx + roi_size, :])
+    digest.update(f"{crop.dtype}{crop.shape}".encode())
+    digest.update(crop)
+    NA_list = np.ascontiguousarray(mat_data["NA_list"])
+    digest.update(f"{NA_list.dtype}{NA_list.shape}".encode())
+    digest.update(NA_list)
+    for key in _SYSTEM_KEYS:
+        if key in mat_data:
+            digest.update(f"{key}={np.asarray(mat_data[key]).ravel().tolist()}".encode())
+    return digest.hexdigest()
+
+
+def array_digest(arrays):
+    """BLAKE2 digest of a dict of arrays, e.g. the warm-start inputs of a run."""
+    digest = hashlib.blake2b(digest_size=20)
+    for name in sorted(arrays):
+        value = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}{value.dtype}{value.shape}".encode())
+        digest.update(value)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Directory of ``<key>.npz`` reconstruction results with size-bounded LRU eviction.
+
+    Recency is tracked through file modification times, which ``load`` refreshes,
+    so several processes can share one cache directory.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIRECTORY
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def make_key(self, algorithm_name, system_params, roi_params, mat_data, init=None):
+        """Cache key for running ``algorithm_name`` with these parameters on this ROI.
+
+        ``init`` holds the warm-start arrays of the run, if any, which change its result.
+        """
+        config = load_algorithm_config(algorithm_name) or {}
+        description = {
+            "dataset": dataset_digest(mat_data, roi_params),
+            "roi": {key: int(value) for key, value in roi_params.items()},
+            "algorithm": algorithm_name,
+            "version": config.get("version", 0),
+            "parameters": {k: v for k, v in system_params.items() if k not in _UNKEYED_PARAMETERS},
+        }
+        if init:
+            description["init"] = array_digest(init)
+        description = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key):
+        """Return the cached result dict for ``key``, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                result = {
+                    "amplitude": f["amplitude"],
+                    "phase": f["phase"],
+                    "pupil": f["pupil"] if "pupil" in f else None,
+                    "history": f["history"],
+                    "metadata": json.loads(str(f["metadata"])),
+                }
+            os.utime(path)  # Mark as recently used
+        except (OSError, KeyError, ValueError):
+            return None
+        return result
+
+    def store(self, key, amplitude, phase, pupil=None, history=(), metadata=None):
+        """Write a result atomically, then evict old entries beyond the size limit."""
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = {
+            "amplitude": np.asarray(amplitude),
+            "phase": np.asarray(phase),
+            "history": np.asarray(history, dtype="float64"),
+            "metadata": np.asarray(json.dumps(metadata or {}, default=str)),
+        }
+        if pupil is not None:
+            arrays["pupil"] = np.asarray(pupil)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """(path, size, mtime) of every cached result, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in ``max_bytes``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove every cached result."""
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
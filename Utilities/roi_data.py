@@ -0,0 +1,36 @@
+"""
+ROI data access for FPM Software reconstruction algorithms
+Reads only the ROI pixels of the requested frames, in the requested order,
+straight into one LED-major float32 buffer without converting the whole stack
+"""
+
+import numpy as np
+
+
+def roi_bounds(shape, roi_params):
+    """(y, x, height, width) of the ROI inside an (H, W, F) stack, clipped at its edges."""
+    H, W = shape[:2]
+    x = roi_params.get("x_offset", W // 2)
+    y = roi_params.get("y_offset", H // 2)
+    size = roi_params.get("roi_size", 256)
+    return y, x, max(0, min(size, H - y)), max(0, min(size, W - x))
+
+
+def read_roi_stack(imlow, y, x, height, width, frames=None, dtype="float32"):
+    """Return frames ``frames`` of the ROI as a C-contiguous (len(frames), height, width) array.
+
+    In-memory and memory-mapped stacks are copied frame by frame from strided
+    views, so the only allocation is the output itself. Lazy HDF5 stacks are
+    read in one request covering just the ROI and the requested frames.
+    """
+    frames = np.arange(imlow.shape[2]) if frames is None else np.asarray(frames, dtype=np.int64)
+    out = np.empty((len(frames), height, width), dtype=dtype)
+    if isinstance(imlow, np.ndarray):
+        for i, frame in enumerate(frames):
+            out[i] = imlow[y:y + height, x:x + width, frame]
+    elif len(frames):
+        unique, inverse = np.unique(frames, return_inverse=True)
+        block = np.asarray(imlow[y:y + height, x:x + width, unique])
+        for i, j in enumerate(inverse):
+            out[i] = block[:, :, j]
+    return out
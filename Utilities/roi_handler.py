@@ -1,12 +1,14 @@
 from PySide6.QtWidgets import (
     QGraphicsScene, QInputDialog, QGraphicsRectItem, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QPushButton
 )
-from PySide6.QtGui import QColor, QPen, QBrush, QImage, QPixmap
+from PySide6.QtGui import QColor, QPen, QBrush, QPixmap
 from PySide6.QtCore import Qt
 import numpy as np
 import os
 from Utilities.logging_utils import log_message
 from Utilities.display_handler import display_image
+from Utilities.frame_stats import get_frame_stats
+from Utilities.tiled_image import image_item
 
 
 class MovableROI(QGraphicsRectItem):
@@ -60,17 +62,13 @@ def display_image_with_roi(main_window):
 
     imlow = main_window.mat_data["imlow"]
     scene = QGraphicsScene()
-    image = imlow[:, :, 0]  # First frame
-
-    # Normalize and convert image
-    image = (image - image.min()) / (image.max() - image.min()) * 255
-    image = image.astype(np.uint8)
-    image = np.ascontiguousarray(image)
+    image = np.asarray(imlow[:, :, 0])  # First frame
 
+    # Normalize using the indexed frame range; large frames are drawn as pyramid tiles
+    image_min, image_max = get_frame_stats(main_window).frame_range(0, image)
     height, width = image.shape
-    q_image = QImage(image.data, width, height, width, QImage.Format_Grayscale8)
-    pixmap = QPixmap.fromImage(q_image)
-    pixmap_item = scene.addPixmap(pixmap)
+    pixmap_item = image_item(image, image_min, image_max)
+    scene.addItem(pixmap_item)
 
     # Get the displayed image's bounding box inside the scene
     main_window.ui.display_window.setScene(scene)
@@ -0,0 +1,118 @@
+"""
+Background log-spectrum cache for FPM Software
+Computes the 8-bit log-magnitude spectra of all raw frames with batched
+scipy.fft transforms on a thread pool, starting with the first spectrum view,
+so later views read them from memory
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psutil
+import scipy.fft
+
+# Upper bound on cached 8-bit spectra, in bytes; frames beyond it are computed on demand
+CACHE_BYTES = 1024 ** 3
+
+# Largest share of the currently available memory the cache takes
+CACHE_MEMORY_FRACTION = 0.25
+
+# Bytes of complex spectra transformed per batch
+BATCH_BYTES = 128 * 1024 ** 2
+
+
+def log_spectra_uint8(block, workers=1):
+    """8-bit log-magnitude spectra of an (H, W, F) block, returned as (F, H, W).
+
+    Each frame is normalized to [0, 255] on its own, as ``mat2gray`` does.
+    """
+    spectra = scipy.fft.fft2(np.asarray(block, dtype="float32"), axes=(0, 1), workers=workers)
+    spectra = np.log1p(np.abs(scipy.fft.fftshift(spectra, axes=(0, 1))))
+    spectra = np.moveaxis(spectra, -1, 0)
+    spectra -= spectra.min(axis=(1, 2), keepdims=True)
+    peak = spectra.max(axis=(1, 2), keepdims=True)
+    np.divide(spectra, peak, out=spectra, where=peak > 0)
+    spectra *= 255
+    return spectra.astype(np.uint8)
+
+
+class SpectrumCache:
+    """8-bit log spectra of an (H, W, F) stack, filled in the background by ``start``.
+
+    Frames are transformed in batches on a thread pool; each batch uses a share
+    of the cores as scipy.fft workers. ``get`` returns a frame's spectrum once
+    its batch is done and None before that.
+    """
+
+    def __init__(self, imlow, workers=None):
+        self.imlow = imlow
+        H, W, F = imlow.shape
+        budget = min(CACHE_BYTES, int(CACHE_MEMORY_FRACTION * psutil.virtual_memory().available))
+        self.capacity = min(F, budget // max(1, H * W))
+        self.spectra = np.empty((self.capacity, H, W), dtype=np.uint8)
+        self.ready = np.zeros(self.capacity, dtype=bool)
+
+        cores = os.cpu_count() or 1
+        self.pool_size = max(1, min(4, workers or cores))
+        self.fft_workers = max(1, cores // self.pool_size)
+        self.batch_frames = max(1, BATCH_BYTES // max(1, H * W * 8))
+
+        self._cancelled = threading.Event()
+        self._executor = None
+        self._futures = []
+
+    def start(self):
+        """Queue every cached frame for computation; returns immediately."""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="Spectrum")
+        for start in range(0, self.capacity, self.batch_frames):
+            stop = min(start + self.batch_frames, self.capacity)
+            self._futures.append(self._executor.submit(self._compute, start, stop))
+        self._executor.shutdown(wait=False)
+
+    def _compute(self, start, stop):
+        if self._cancelled.is_set():
+            return
+        self.spectra[start:stop] = log_spectra_uint8(self.imlow[:, :, start:stop], self.fft_workers)
+        self.ready[start:stop] = True
+
+    def cancel(self):
+        """Skip batches that have not started yet."""
+        self._cancelled.set()
+
+    def is_complete(self):
+        return bool(self.ready.all())
+
+    def get(self, frame):
+        """8-bit spectrum of ``frame`` if it has been computed, else None."""
+        if frame < self.capacity and self.ready[frame]:
+            return self.spectra[frame]
+        return None
+
+    def spectrum(self, frame):
+        """8-bit spectrum of ``frame``, computing it now if it is not cached yet."""
+        cached = self.get(frame)
+        if cached is not None:
+            return cached
+        return log_spectra_uint8(self.imlow[:, :, frame:frame + 1], self.fft_workers)[0]
+
+
+def get_spectrum_cache(owner):
+    """Return ``owner.spectrum_cache`` for ``owner.mat_data["imlow"]``, creating and starting it on first use.
+
+    The cache lives on the owner (the main window), not in ``mat_data``, which
+    is passed to the algorithms and hashed by the result cache. A cache of a
+    previously loaded stack is cancelled and replaced.
+    """
+    imlow = owner.mat_data["imlow"]
+    cache = getattr(owner, "spectrum_cache", None)
+    if not isinstance(cache, SpectrumCache) or cache.imlow is not imlow:
+        if isinstance(cache, SpectrumCache):
+            cache.cancel()
+        cache = SpectrumCache(imlow)
+        owner.spectrum_cache = cache
+        cache.start()
+    return cache
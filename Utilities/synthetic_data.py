@@ -0,0 +1,109 @@
+"""
+Synthetic FPM dataset generator for FPM Software
+Simulates low-resolution intensity stacks from a known complex object and pupil
+with the same forward model and conventions the reconstruction algorithms use
+"""
+
+import numpy as np
+import torch
+
+
+def make_test_object(size, seed=0, phase_range=np.pi / 2):
+    """Smooth random complex object of shape (size, size) with unit-scale amplitude."""
+    rng = np.random.default_rng(seed)
+    fx = np.fft.fftfreq(size)
+    f2 = fx[None, :] ** 2 + fx[:, None] ** 2
+
+    def smooth_field(sigma):
+        noise = np.fft.fft2(rng.standard_normal((size, size)))
+        field = np.real(np.fft.ifft2(noise * np.exp(-f2 / (2 * sigma ** 2))))
+        return (field - field.min()) / max(field.max() - field.min(), 1e-12)
+
+    amplitude = 0.4 + 0.6 * smooth_field(0.05)
+    phase = phase_range * (smooth_field(0.03) - 0.5)
+    return (amplitude * np.exp(1j * phase)).astype("complex64")
+
+
+def make_pupil(N, NA, wavelength, dpix, aberration=None):
+    """Circular pupil of radius NA * k0 on the N x N low-resolution frequency grid.
+
+    ``aberration`` is an optional (N, N) phase map in radians applied inside the pupil.
+    """
+    k = np.arange(-N / 2, N / 2) / (N * dpix) * 2 * np.pi
+    kxx, kyy = np.meshgrid(k, k)
+    kmax = NA * 2 * np.pi / wavelength
+    pupil = (kxx ** 2 + kyy ** 2 <= kmax ** 2).astype("complex64")
+    if aberration is not None:
+        pupil *= np.exp(1j * aberration).astype("complex64")
+    return pupil
+
+
+def led_grid_na(n_side, na_step):
+    """Illumination NAs (n_side**2, 2) of a square LED grid with a fixed NA spacing."""
+    offsets = (np.arange(n_side) - (n_side - 1) / 2) * na_step
+    u, v = np.meshgrid(offsets, offsets)
+    return np.stack([u.ravel(), v.ravel()], axis=1).astype("float32")
+
+
+def simulate_fpm_dataset(roi_size=128, n_leds=9, NA=0.1, na_step=0.04, wavelength=0.5, dpix_c=3.45, mag=4.0,
+                         upsample=4, obj=None, pupil=None, noise=0.0, seed=0, batch_size=64, device=None):
+    """Simulate an FPM acquisition and return it with the ground truth.
+
+    The object spectrum is sampled at ``upsample`` times the camera resolution.
+    For every LED the shifted sub-spectrum is filtered by the pupil and
+    transformed back in batches of ``batch_size`` frames. Returns ``(mat_data,
+    truth)``, where ``mat_data`` has the same keys as a loaded .mat file and
+    ``truth`` holds the object and pupil used.
+    """
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    N = roi_size
+    N_up = N * upsample
+    dpix = dpix_c / mag
+    k0 = 2 * np.pi / wavelength
+
+    if obj is None:
+        obj = make_test_object(N_up, seed=seed)
+    if pupil is None:
+        pupil = make_pupil(N, NA, wavelength, dpix)
+    NA_list = led_grid_na(n_leds, na_step)
+
+    # LED positions on the high-resolution spectrum, as the reconstruction finds them
+    Fxx1 = np.arange(-N_up // 2, N_up // 2) / (N * dpix) * (2 * np.pi)
+    ledpos = np.stack([
+        np.argmin(np.abs(Fxx1[None, :] + k0 * NA_list[:, 0, None]), axis=1),
+        np.argmin(np.abs(Fxx1[None, :] + k0 * NA_list[:, 1, None]), axis=1),
+    ], axis=1)
+    inside = np.all((ledpos >= N // 2) & (ledpos <= N_up - N // 2), axis=1)
+    if not inside.all():
+        raise ValueError("Some LEDs fall outside the simulated spectrum; increase upsample or reduce na_step.")
+
+    O = torch.fft.fftshift(torch.fft.fft2(torch.from_numpy(obj).to(device)))
+    P = torch.from_numpy(pupil).to(device)
+    offsets = torch.arange(-N // 2, N // 2, device=device)
+    ledpos_t = torch.from_numpy(ledpos).to(device)
+
+    frames = []
+    for start in range(0, len(NA_list), batch_size):
+        pos = ledpos_t[start:start + batch_size]
+        rows = (pos[:, 1, None] + offsets)[:, :, None]
+        cols = (pos[:, 0, None] + offsets)[:, None, :]
+        patches = O[rows, cols] * P / (upsample ** 2)
+        fields = torch.fft.ifft2(torch.fft.ifftshift(patches, dim=(-2, -1)))
+        frames.append((torch.abs(fields) ** 2).cpu())
+    imlow = torch.cat(frames).numpy()
+
+    if noise > 0:
+        rng = np.random.default_rng(seed + 1)
+        imlow = imlow + noise * imlow.max() * rng.standard_normal(imlow.shape).astype("float32")
+        imlow = np.clip(imlow, 0, None)
+
+    mat_data = {
+        "imlow": np.ascontiguousarray(imlow.transpose(1, 2, 0)).astype("float32"),
+        "NA_list": NA_list,
+        "NA": NA,
+        "lambda": wavelength,
+        "dpix_c": dpix_c,
+        "mag": mag,
+    }
+    truth = {"object": obj, "pupil": pupil, "upsample": upsample}
+    return mat_data, truth
@@ -46,7 +46,7 @@ class SystemSpecsWindow(QWidget):
         self.populate_algorithm_list(detected_algorithms)
 
         # Validate NA_list and imlow consistency
-        if "imlow" not in mat_data or not isinstance(mat_data["imlow"], np.ndarray):
+        if "imlow" not in mat_data or not hasattr(mat_data["imlow"], "shape"):
             log_message(self.main_window.ui, "Error: imlow data is missing or corrupted.")
             self.ui.NA_list.setText("Error: imlow missing")
             return
@@ -0,0 +1,124 @@
+"""
+Tiled multi-resolution image display for FPM Software
+Large frames and stitched results are drawn from a lazily computed image
+pyramid, uploading only the tiles visible at the current zoom level
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsPixmapItem
+
+from Utilities.image_utils import to_qimage, to_uint8
+
+# Images with a side longer than this are displayed tiled
+TILED_THRESHOLD = 2048
+
+# Side of a square tile, in pixels of its pyramid level
+TILE_SIZE = 256
+
+# Upper bound on uploaded tile pixmaps, in bytes
+TILE_CACHE_BYTES = 128 * 1024 ** 2
+
+
+class ImagePyramid:
+    """2D image with lazily built 2x-downsampled levels cut into 8-bit tiles.
+
+    Level 0 is the image itself; level k averages 2**k x 2**k blocks and is only
+    computed when a tile of it is first requested. Tiles are normalized from
+    [vmin, vmax] and kept as QPixmaps in an LRU cache, so they must be requested
+    from the GUI thread.
+    """
+
+    def __init__(self, image, vmin=None, vmax=None):
+        self.height, self.width = image.shape
+        if vmin is None or vmax is None:
+            vmin, vmax = float(np.min(image)), float(np.max(image))
+        self.vmin, self.vmax = vmin, vmax
+        self.max_level = max(0, math.ceil(math.log2(max(self.height, self.width) / TILE_SIZE)))
+        self._levels = {0: image}
+        self._tiles = OrderedDict()
+        self._max_tiles = max(16, TILE_CACHE_BYTES // (TILE_SIZE * TILE_SIZE))
+
+    def level_for_scale(self, scale):
+        """Coarsest level that still has at least one image pixel per screen pixel."""
+        if scale >= 1:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1 / scale))))
+
+    def level(self, k):
+        """Level ``k`` as a 2D array, computing the missing levels below it."""
+        if k not in self._levels:
+            previous = np.asarray(self.level(k - 1), dtype="float32")
+            # Replicate the last row/column so odd sizes keep their edge pixels
+            if previous.shape[0] % 2:
+                previous = np.concatenate([previous, previous[-1:]], axis=0)
+            if previous.shape[1] % 2:
+                previous = np.concatenate([previous, previous[:, -1:]], axis=1)
+            h, w = previous.shape
+            self._levels[k] = previous.reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+        return self._levels[k]
+
+    def tile(self, k, row, col):
+        """QPixmap of tile (row, col) at level ``k``."""
+        key = (k, row, col)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+
+        data = self.level(k)[row * TILE_SIZE:(row + 1) * TILE_SIZE, col * TILE_SIZE:(col + 1) * TILE_SIZE]
+        pixmap = QPixmap.fromImage(to_qimage(to_uint8(np.asarray(data), self.vmin, self.vmax)))
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self._max_tiles:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+
+class TiledImageItem(QGraphicsItem):
+    """Graphics item drawing an ImagePyramid in image-pixel scene coordinates.
+
+    Each paint picks the pyramid level matching the view's zoom and draws only
+    the tiles intersecting the exposed rectangle.
+    """
+
+    def __init__(self, pyramid, parent=None):
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def paint(self, painter, option, widget=None):
+        pyramid = self.pyramid
+        scale = option.levelOfDetailFromTransform(painter.worldTransform())
+        k = pyramid.level_for_scale(scale)
+        factor = 2 ** k
+        span = TILE_SIZE * factor  # Image pixels covered by one tile
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        first_row, last_row = int(exposed.top() // span), int(math.ceil(exposed.bottom() / span))
+        first_col, last_col = int(exposed.left() // span), int(math.ceil(exposed.right() / span))
+
+        for row in range(first_row, last_row):
+            for col in range(first_col, last_col):
+                pixmap = pyramid.tile(k, row, col)
+                x, y = col * span, row * span
+                # Edge tiles of coarse levels may overhang the image by less than one level pixel
+                width = min(pixmap.width() * factor, pyramid.width - x)
+                height = min(pixmap.height() * factor, pyramid.height - y)
+                painter.drawPixmap(QRectF(x, y, width, height), pixmap,
+                                   QRectF(0, 0, width / factor, height / factor))
+
+
+def image_item(image, vmin=None, vmax=None):
+    """Graphics item for a 2D image: a pixmap when small, a TiledImageItem when large."""
+    if max(image.shape) > TILED_THRESHOLD:
+        return TiledImageItem(ImagePyramid(image, vmin, vmax))
+    return QGraphicsPixmapItem(QPixmap.fromImage(to_qimage(to_uint8(image, vmin, vmax))))
@@ -0,0 +1,92 @@
+"""
+Zernike polynomials for FPM Software
+Noll-ordered, orthonormal Zernike modes on a pupil mask, used to describe and
+regularize recovered pupil aberrations with a handful of coefficients
+"""
+
+import math
+
+import numpy as np
+
+# Common names of the low-order modes, by Noll index
+MODE_NAMES = {
+    1: "piston", 2: "tilt x", 3: "tilt y", 4: "defocus", 5: "astigmatism 45", 6: "astigmatism 0",
+    7: "coma y", 8: "coma x", 9: "trefoil y", 10: "trefoil x", 11: "spherical",
+}
+
+
+def noll_indices(order):
+    """(n, m) of every mode with radial order n <= ``order``, in Noll order."""
+    modes = []
+    for n in range(order + 1):
+        for m in range(-n, n + 1, 2):
+            modes.append((n, m))
+
+    def noll(mode):
+        n, m = mode
+        j = n * (n + 1) // 2 + abs(m)
+        # Within a radial order Noll numbers even j for cosine (m >= 0) terms
+        if (m > 0 and j % 2) or (m < 0 and j % 2 == 0) or (m == 0 and n % 4 in (1, 2)):
+            j += 1
+        return j
+
+    return sorted(modes, key=noll)
+
+
+def zernike(n, m, rho, theta):
+    """Orthonormal Zernike mode (n, m) on the unit disk, zero outside it."""
+    radial = np.zeros_like(rho)
+    for k in range((n - abs(m)) // 2 + 1):
+        radial += ((-1) ** k * math.factorial(n - k) /
+                   (math.factorial(k) * math.factorial((n + abs(m)) // 2 - k) *
+                    math.factorial((n - abs(m)) // 2 - k))) * rho ** (n - 2 * k)
+    if m == 0:
+        mode = math.sqrt(n + 1) * radial
+    elif m > 0:
+        mode = math.sqrt(2 * (n + 1)) * radial * np.cos(m * theta)
+    else:
+        mode = math.sqrt(2 * (n + 1)) * radial * np.sin(-m * theta)
+    return np.where(rho <= 1, mode, 0.0)
+
+
+def zernike_basis(mask, order):
+    """(K, N, N) Zernike modes up to radial ``order`` on the disk spanned by ``mask``.
+
+    ``mask`` is the binary N x N pupil on the reconstruction's frequency grid,
+    with the same ``arange(-N / 2, N / 2)`` coordinates; its furthest pixel
+    lies on the unit circle.
+    """
+    mask = np.asarray(mask) != 0
+    N = mask.shape[0]
+    y, x = np.meshgrid(np.arange(-N / 2, N / 2), np.arange(-N / 2, N / 2), indexing="ij")
+    r = np.hypot(x, y)
+    radius = max(float(r[mask].max()) if mask.any() else 1.0, 1.0)
+    rho, theta = r / radius, np.arctan2(y, x)
+    return np.stack([zernike(n, m, rho, theta) * mask for n, m in noll_indices(order)])
+
+
+def fit_zernike(phase, basis, mask=None):
+    """Least-squares Zernike coefficients of ``phase`` (radians) inside ``mask``."""
+    mask = (basis[0] != 0) if mask is None else (np.asarray(mask) != 0)
+    coefficients, *_ = np.linalg.lstsq(basis[:, mask].T, np.asarray(phase)[mask], rcond=None)
+    return coefficients
+
+
+def zernike_phase(coefficients, basis):
+    """Phase map of the given coefficients."""
+    return np.tensordot(np.asarray(coefficients), basis, axes=1)
+
+
+def pupil_coefficients(pupil, order=4):
+    """Zernike coefficients of a complex pupil's phase over its nonzero support."""
+    pupil = np.asarray(pupil)
+    mask = np.abs(pupil) > 0
+    return fit_zernike(np.angle(pupil), zernike_basis(mask, order), mask)
+
+
+def describe(coefficients, first=4, last=11):
+    """Short listing of the coefficients with Noll index ``first`` to ``last``, in radians."""
+    parts = []
+    for j in range(first, min(last, len(coefficients)) + 1):
+        parts.append(f"{MODE_NAMES.get(j, f'Z{j}')} {coefficients[j - 1]:+.2f}")
+    return ", ".join(parts)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+FPM Software Reconstruction Benchmark
+Times run_algorithm on synthetic datasets across ROI sizes, upsample factors and
+modes, and writes machine-readable results (JSON, plus CSV if requested)
+
+Example:
+    python benchmarks/bench_run_algorithm.py --sizes 64,128 --upsamples 2,4 --modes bright,all -o bench.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIRECTORY not in sys.path:
+    sys.path.insert(0, ROOT_DIRECTORY)
+
+import numpy as np
+import torch
+
+from Utilities.algorithm_loader import load_algorithm, default_parameters, convert_parameter
+from Utilities.synthetic_data import simulate_fpm_dataset
+
+
+def parse_list(text, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark run_algorithm on synthetic FPM data.")
+    parser.add_argument("--alg", default="Gerchberg-Saxton", help="Algorithm folder under Algorithms/")
+    parser.add_argument("--sizes", default="64,128", help="Comma-separated ROI sizes")
+    parser.add_argument("--upsamples", default="2,3,4", help="Comma-separated upsample factors")
+    parser.add_argument("--modes", default="bright,all", help="Comma-separated imaging modes")
+    parser.add_argument("--leds", type=int, default=9, help="LEDs per side of the square LED grid")
+    parser.add_argument("--na-step", type=float, default=0.04, help="Illumination NA spacing between LEDs")
+    parser.add_argument("--iters", type=int, default=5, help="Iterations per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per configuration")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra algorithm parameter applied to every run (repeatable)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic object")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON output path")
+    parser.add_argument("--csv", default=None, help="Optional CSV output path")
+    return parser.parse_args(argv)
+
+
+def environment_info():
+    """Hardware and library versions, so results from different machines can be compared"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "device": "cuda" if torch.cuda.is_available() else "cpu",
+        "gpu": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+
+
+def time_run(run_algorithm, system_params, roi_params, mat_data):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    run_algorithm(system_params=system_params, roi_params=roi_params, mat_data=mat_data)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_algorithm = load_algorithm(args.alg)
+    defaults = default_parameters(args.alg)
+    overrides = {}
+    for item in args.overrides:
+        key, _, value = item.partition("=")
+        overrides[key.strip()] = convert_parameter(value.strip(), type(defaults.get(key.strip(), "")).__name__)
+
+    results = []
+    for size in parse_list(args.sizes, int):
+        for upsample in parse_list(args.upsamples, int):
+            mat_data, _ = simulate_fpm_dataset(roi_size=size, n_leds=args.leds, na_step=args.na_step,
+                                               upsample=max(upsample, 2), seed=args.seed)
+            roi_params = {"x_offset": 0, "y_offset": 0, "roi_size": size}
+            for mode in parse_list(args.modes, str):
+                system_params = dict(defaults, upsample=upsample, mode=mode, num_iters=args.iters, **overrides)
+                times = [time_run(run_algorithm, system_params, roi_params, mat_data)
+                         for _ in range(args.repeat)]
+                record = {
+                    "algorithm": args.alg,
+                    "roi_size": size,
+                    "upsample": upsample,
+                    "mode": mode,
+                    "leds": args.leds ** 2,
+                    "num_iters": args.iters,
+                    "parameters": system_params,
+                    "first_s": times[0],
+                    "min_s": min(times),
+                    "median_s": statistics.median(times),
+                    "per_iter_s": statistics.median(times) / args.iters,
+                    "times_s": times,
+                }
+                results.append(record)
+                print(f"size={size:5d} upsample={upsample} mode={mode:6s} "
+                      f"median={record['median_s']:.3f}s first={record['first_s']:.3f}s", flush=True)
+
+    report = {"environment": environment_info(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[OK] Results written to {args.output}")
+
+    if args.csv:
+        columns = ["algorithm", "roi_size", "upsample", "mode", "leds", "num_iters",
+                   "first_s", "min_s", "median_s", "per_iter_s"]
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"[OK] CSV written to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
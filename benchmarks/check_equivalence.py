@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+FPM Software Reconstruction Equivalence Check
+Runs an algorithm's main_alg.py from a baseline git revision (or file) and from
+the working tree on the same synthetic datasets, and fails if their amplitude,
+phase or pupil differ by more than a tolerance (bit-exact by default)
+
+Example:
+    python benchmarks/check_equivalence.py --baseline HEAD~1
+    python benchmarks/check_equivalence.py --baseline old_main_alg.py --sizes 64,256 --tolerance 1e-6
+"""
+
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIRECTORY not in sys.path:
+    sys.path.insert(0, ROOT_DIRECTORY)
+
+import numpy as np
+import torch
+
+from Utilities.algorithm_loader import ALGORITHM_DIRECTORY, default_parameters
+from Utilities.synthetic_data import simulate_fpm_dataset
+
+# Configurations the hot loop must reproduce, as (name, parameter overrides, warm-start pupil)
+CASES = [
+    ("sequential all", {"mode": "all"}, False),
+    ("sequential bright", {"mode": "bright"}, False),
+    ("batched all", {"mode": "all", "batched": True}, False),
+    ("batched bright", {"mode": "bright", "batched": True}, False),
+    ("pupil recovery", {"mode": "all", "pupil_correction": True, "zernike_order": 0}, False),
+    ("pupil recovery zernike", {"mode": "all", "pupil_correction": True, "zernike_order": 4}, False),
+    ("batched pupil recovery", {"mode": "all", "batched": True, "pupil_correction": True}, False),
+    ("priority LEDs", {"mode": "all", "led_selection": "priority"}, False),
+    ("stochastic LEDs", {"mode": "all", "led_selection": "stochastic"}, False),
+    ("warm-start pupil", {"mode": "all", "pupil_correction": True}, True),
+    ("warm-start fixed pupil", {"mode": "all"}, True),
+    ("batched warm-start fixed pupil", {"mode": "all", "batched": True}, True),
+]
+
+
+def parse_list(text, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare run_algorithm against a baseline revision.")
+    parser.add_argument("--alg", default="Gerchberg-Saxton", help="Algorithm folder under Algorithms/")
+    parser.add_argument("--baseline", default="HEAD",
+                        help="Git revision or path of the baseline main_alg.py (default: HEAD)")
+    parser.add_argument("--sizes", default="64", help="Comma-separated ROI sizes")
+    parser.add_argument("--upsample", type=int, default=3, help="Upsample factor")
+    parser.add_argument("--leds", type=int, default=9, help="LEDs per side of the square LED grid")
+    parser.add_argument("--iters", type=int, default=6, help="Iterations per run")
+    parser.add_argument("--cases", default=None, help="Comma-separated case names to run (default: all)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Largest allowed absolute difference (default: 0, bit-exact)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic object")
+    return parser.parse_args(argv)
+
+
+def load_module(path, name):
+    """Import a main_alg.py from ``path`` under ``name``."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def baseline_source(algorithm, baseline, directory):
+    """Path of the baseline main_alg.py, written from git into ``directory`` unless a file is given."""
+    if os.path.isfile(baseline):
+        return baseline
+    relative = f"{ALGORITHM_DIRECTORY}/{algorithm}/main_alg.py"
+    source = subprocess.run(["git", "show", f"{baseline}:{relative}"], cwd=ROOT_DIRECTORY,
+                            capture_output=True, text=True, check=True).stdout
+    path = os.path.join(directory, "baseline_main_alg.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    return path
+
+
+def max_difference(a, b):
+    a, b = torch.as_tensor(a), torch.as_tensor(b)
+    if a.shape != b.shape:
+        return float("inf")
+    return float((a - b).abs().max()) if a.numel() else 0.0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = CASES
+    if args.cases:
+        names = parse_list(args.cases, str)
+        cases = [case for case in CASES if case[0] in names]
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = load_module(baseline_source(args.alg, args.baseline, directory), "baseline_main_alg")
+    current = load_module(os.path.join(ROOT_DIRECTORY, ALGORITHM_DIRECTORY, args.alg, "main_alg.py"),
+                          "current_main_alg")
+    defaults = dict(default_parameters(args.alg), checkpoint_interval=0)
+
+    failures = 0
+    for size in parse_list(args.sizes, int):
+        mat_data, _ = simulate_fpm_dataset(roi_size=size, n_leds=args.leds, upsample=max(args.upsample, 2),
+                                           seed=args.seed)
+        roi_params = {"x_offset": 0, "y_offset": 0, "roi_size": size}
+        rng = np.random.default_rng(args.seed)
+        init_pupil = np.exp(0.1j * rng.standard_normal((size, size))).astype("complex64")
+        for name, overrides, warm_start in cases:
+            system_params = dict(defaults, upsample=args.upsample, num_iters=args.iters, **overrides)
+            kwargs = {"init_pupil": init_pupil} if warm_start else {}
+            expected = baseline.run_algorithm(system_params, roi_params, mat_data, **kwargs)
+            result = current.run_algorithm(system_params, roi_params, mat_data, **kwargs)
+            differences = [max_difference(a, b) for a, b in zip(result, expected)]
+            ok = max(differences) <= args.tolerance
+            failures += not ok
+            print(f"size={size:5d} {name:<30s} amplitude={differences[0]:.3g} phase={differences[1]:.3g} "
+                  f"pupil={differences[2]:.3g} {'OK' if ok else 'DIFFERS'}", flush=True)
+
+    if failures:
+        print(f"[FAIL] {failures} case(s) differ from {args.baseline} by more than {args.tolerance:g}")
+        return 1
+    print(f"[OK] All cases match {args.baseline} within {args.tolerance:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
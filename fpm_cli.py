@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+FPM Software Command-Line Reconstruction
+Runs a reconstruction without the GUI, for batch jobs on compute nodes
+
+Example:
+    fpm-reconstruct data.mat --alg Gerchberg-Saxton --roi 0,0,256 --params params.yml -o out.h5
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Algorithms and Utilities are imported relative to the repository root
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="fpm-reconstruct",
+        description="Reconstruct an FPM dataset without the GUI.",
+    )
+    parser.add_argument("data", help="Input .mat file containing imlow and NA_list")
+    parser.add_argument("--alg", default="Gerchberg-Saxton",
+                        help="Algorithm folder under Algorithms/ (default: Gerchberg-Saxton)")
+    parser.add_argument("--roi", default=None,
+                        help="ROI as x,y,size in pixels (default: centered 256 px ROI)")
+    parser.add_argument("--params", default=None,
+                        help="YAML file with algorithm parameters overriding config.yml defaults")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a single algorithm parameter (repeatable)")
+    parser.add_argument("--full-field", action="store_true",
+                        help="Reconstruct the whole field as stitched tiles instead of one ROI")
+    parser.add_argument("--tile-size", type=int, default=256, help="Tile size for --full-field (default: 256)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for --full-field (default: all cores)")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.h5, .npz or .mat)")
+    parser.add_argument("--profile", default=None, metavar="TRACE.json",
+                        help="Record per-phase timings, print a summary and write a Chrome trace")
+    parser.add_argument("--init", default=None, metavar="RESULT",
+                        help="Warm-start from a previous result file (.h5, .npz or .mat written by this tool), "
+                             "e.g. the previous timepoint")
+    parser.add_argument("--init-pupil", default=None, metavar="PUPIL",
+                        help="Start from a pupil exported with --export-pupil (or the pupil of a result file), "
+                             "e.g. one recovered earlier on the same microscope")
+    parser.add_argument("--export-pupil", default=None, metavar="PUPIL",
+                        help="Also write the recovered pupil with its Zernike coefficients to PUPIL (.npz or .npy)")
+    parser.add_argument("--pupil-library", nargs="?", const="", default=None, metavar="DIR",
+                        help="Start from the nearest pupil in the pupil library (optionally in DIR) and, with "
+                             "pupil_correction, store the recovered pupil there")
+    parser.add_argument("--checkpoint-dir", default=None, metavar="DIR",
+                        help="Save checkpoints every checkpoint_interval iterations (and finished --full-field "
+                             "tiles) in DIR; re-running the same command resumes from them")
+    parser.add_argument("--no-fit-memory", dest="fit_memory", action="store_false",
+                        help="Refuse runs predicted not to fit in memory instead of shrinking them")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors")
+    return parser.parse_args(argv)
+
+
+def parse_roi(roi_text, shape):
+    """Return roi_params from 'x,y,size', defaulting to a centered 256 px ROI"""
+    height, width = shape[:2]
+    if roi_text is None:
+        size = min(256, height, width)
+        return {"x_offset": (width - size) // 2, "y_offset": (height - size) // 2, "roi_size": size}
+
+    values = [int(v) for v in roi_text.split(",")]
+    if len(values) != 3:
+        raise ValueError(f"ROI must be given as x,y,size, got '{roi_text}'")
+    x_offset, y_offset, size = values
+    if x_offset < 0 or y_offset < 0 or x_offset + size > width or y_offset + size > height:
+        raise ValueError(f"ROI {values} does not fit in a {height}x{width} image")
+    return {"x_offset": x_offset, "y_offset": y_offset, "roi_size": size}
+
+
+def load_parameters(algorithm_name, params_path, overrides):
+    """Merge config.yml defaults, an optional parameter file and KEY=VALUE overrides"""
+    import yaml
+    from Utilities.algorithm_loader import load_algorithm_config, default_parameters, convert_parameter
+
+    config = load_algorithm_config(algorithm_name) or {}
+    types = {key: info.get("type", "str") for key, info in config.get("parameters", {}).items()}
+    params = default_parameters(algorithm_name)
+
+    if params_path:
+        with open(params_path, "r") as f:
+            user_params = yaml.safe_load(f) or {}
+        # Accept either a flat mapping or a config.yml-style 'parameters' section
+        if isinstance(user_params.get("parameters"), dict):
+            user_params = {
+                key: info.get("default") if isinstance(info, dict) else info
+                for key, info in user_params["parameters"].items()
+            }
+        params.update(user_params)
+
+    for item in overrides:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Override must be KEY=VALUE, got '{item}'")
+        params[key.strip()] = value.strip()
+
+    return {key: convert_parameter(value, types.get(key, "str")) for key, value in params.items()}
+
+
+def save_results(output_path, amplitude, phase, pupil, metadata):
+    """Write the reconstruction to .h5, .npz or .mat depending on the extension"""
+    import numpy as np
+
+    results = {"amplitude": amplitude, "phase": phase}
+    if pupil is not None:
+        results["pupil"] = pupil
+    extension = os.path.splitext(output_path)[1].lower()
+
+    if extension in (".h5", ".hdf5"):
+        import h5py
+        with h5py.File(output_path, "w") as f:
+            for name, value in results.items():
+                f.create_dataset(name, data=value, compression="gzip")
+            f.attrs["metadata"] = json.dumps(metadata)
+    elif extension == ".npz":
+        np.savez_compressed(output_path, metadata=json.dumps(metadata), **results)
+    elif extension == ".mat":
+        import scipy.io
+        scipy.io.savemat(output_path, dict(results, metadata=json.dumps(metadata)), do_compression=True)
+    else:
+        raise ValueError(f"Unsupported output format '{extension}' (use .h5, .npz or .mat)")
+
+
+def load_results(input_path):
+    """Read amplitude, phase and pupil (None if absent) written by save_results"""
+    import numpy as np
+
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension in (".h5", ".hdf5"):
+        import h5py
+        with h5py.File(input_path, "r") as f:
+            results = {name: f[name][()] for name in ("amplitude", "phase", "pupil") if name in f}
+    elif extension == ".npz":
+        with np.load(input_path) as f:
+            results = {name: f[name] for name in ("amplitude", "phase", "pupil") if name in f}
+    elif extension == ".mat":
+        import scipy.io
+        results = scipy.io.loadmat(input_path)
+    else:
+        raise ValueError(f"Unsupported result format '{extension}' (use .h5, .npz or .mat)")
+
+    for field in ("amplitude", "phase"):
+        if field not in results:
+            raise ValueError(f"Required field '{field}' missing from {input_path}")
+    return results["amplitude"], results["phase"], results.get("pupil")
+
+
+def main(argv=None):
+    """Command-line entry point; returns the process exit code"""
+    args = parse_args(argv)
+    if ROOT_DIRECTORY not in sys.path:
+        sys.path.insert(0, ROOT_DIRECTORY)
+
+    def log(msg):
+        if not args.quiet:
+            print(msg, file=sys.stderr, flush=True)
+
+    try:
+        from Utilities.data_handler import read_mat_file
+        from Utilities.algorithm_loader import load_algorithm
+
+        system_params = load_parameters(args.alg, args.params, args.overrides)
+        mat_data, reader = read_mat_file(args.data)
+        log(f"Loaded {os.path.basename(args.data)} using {reader}.")
+
+        for field in ("imlow", "NA_list"):
+            if field not in mat_data:
+                raise ValueError(f"Required field '{field}' missing from {args.data}")
+        if len(mat_data["imlow"].shape) != 3:
+            raise ValueError("'imlow' must be a 3D array")
+
+        def to_numpy(value):
+            return value.cpu().numpy() if hasattr(value, "cpu") else value
+
+        metadata = {"algorithm": args.alg, "parameters": system_params, "source": os.path.abspath(args.data)}
+        # Warm start from a previous result
+        init = {}
+        if args.init:
+            import numpy as np
+            amplitude, phase, pupil = load_results(args.init)
+            init["init_object"] = (amplitude * np.exp(1j * phase)).astype("complex64")
+            if pupil is not None:
+                init["init_pupil"] = pupil
+            metadata["init"] = os.path.abspath(args.init)
+            log(f"Warm start from {os.path.basename(args.init)}.")
+        if args.init_pupil:
+            from Utilities.pupil_io import load_pupil
+            init["init_pupil"] = load_pupil(args.init_pupil)
+            metadata["init_pupil"] = os.path.abspath(args.init_pupil)
+            log(f"Initial pupil from {os.path.basename(args.init_pupil)}.")
+
+        pupil_library = None
+        if args.pupil_library is not None:
+            from Utilities.pupil_library import PupilLibrary
+            pupil_library = PupilLibrary(args.pupil_library or None)
+        store_pupil = pupil_library is not None and bool(system_params.get("pupil_correction"))
+
+        def run_key(*parts):
+            # Checkpoints belong to one input file, algorithm, parameter set and warm start
+            from Utilities.checkpoint import checkpoint_key
+            files = [os.path.abspath(path) for path in (args.data, args.init, args.init_pupil) if path]
+            return checkpoint_key(args.alg, system_params, [(path, os.path.getmtime(path)) for path in files], *parts)
+
+        if args.full_field:
+            from Utilities.full_field import reconstruct_full_field
+            metadata["full_field"] = {"tile_size": args.tile_size}
+            checkpoint_directory = None
+            if args.checkpoint_dir:
+                checkpoint_directory = os.path.join(args.checkpoint_dir, f"full-field-{run_key(args.tile_size)}")
+            if args.profile:
+                log("Profiling is not available with --full-field; ignoring --profile.")
+            Amp, Phase, Pupil = reconstruct_full_field(
+                args.alg, system_params, mat_data,
+                tile_size=args.tile_size, overlap=args.tile_size // 8, workers=args.workers,
+                checkpoint_directory=checkpoint_directory, pupil_library=pupil_library, log_callback=log, **init
+            )
+        else:
+            from Utilities.resource_estimator import check_memory, estimate_resources, fit_to_memory
+            roi_params = parse_roi(args.roi, mat_data["imlow"].shape)
+            if args.fit_memory:
+                system_params, roi_params, estimate, changes = fit_to_memory(system_params, roi_params, mat_data)
+                if changes:
+                    log(f"Adjusted to fit available memory: {', '.join(changes)}")
+                metadata["parameters"] = system_params
+            else:
+                estimate = estimate_resources(system_params, roi_params, mat_data)
+                check_memory(estimate)
+            log(estimate.summary())
+            metadata["roi"] = roi_params
+            if pupil_library is not None and "init_pupil" not in init:
+                prior = pupil_library.nearest(mat_data, roi_params)
+                if prior is not None:
+                    init["init_pupil"], position = prior
+                    log(f"Pupil prior from the library entry at ({position[0]:.0f}, {position[1]:.0f}).")
+            run_algorithm = load_algorithm(args.alg)
+            profiler = None
+            extra = dict(init)
+            if args.profile:
+                from Utilities.profiling import PhaseProfiler
+                profiler = PhaseProfiler()
+                extra["profile_callback"] = profiler
+            if args.checkpoint_dir and int(system_params.get("checkpoint_interval", 0)) > 0:
+                from Utilities.checkpoint import checkpoint_path
+                extra["checkpoint_path"] = checkpoint_path(run_key(roi_params), args.checkpoint_dir)
+            Amp, Phase, Pupil = run_algorithm(
+                system_params=system_params,
+                roi_params=roi_params,
+                mat_data=mat_data,
+                log_callback=lambda msg: log(f"[{args.alg}] {msg}"),
+                **extra
+            )
+            if profiler is not None:
+                log(profiler.summary_table())
+                profiler.save_chrome_trace(args.profile)
+                log(f"[OK] Chrome trace written to {args.profile}")
+            if store_pupil:
+                pupil_library.store(to_numpy(Pupil), mat_data, roi_params, metadata)
+                log(f"[OK] Pupil stored in the library at {pupil_library.directory}")
+
+        save_results(args.output, to_numpy(Amp), to_numpy(Phase), to_numpy(Pupil), metadata)
+        log(f"[OK] Results written to {args.output}")
+        if args.export_pupil:
+            from Utilities.pupil_io import save_pupil
+            save_pupil(args.export_pupil, to_numpy(Pupil), metadata)
+            log(f"[OK] Pupil written to {args.export_pupil}")
+        return 0
+
+    except ImportError as e:
+        print(f"[ERROR] Algorithm module not found: {e}", file=sys.stderr)
+    except MemoryError as e:
+        print(f"[ERROR] Insufficient memory{f': {e}' if str(e) else ''}. Try smaller ROI or reduce upsampling.",
+              file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+    except Exception as e:
+        print(f"[ERROR] Algorithm failed: {e}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 import os
-import yaml
+import datetime
 import webbrowser
 import numpy as np
-from PySide6.QtWidgets import QApplication, QMainWindow, QStatusBar, QProgressBar
+from PySide6.QtWidgets import (QApplication, QMainWindow, QStatusBar, QProgressBar, QInputDialog, QPushButton,
+                               QFileDialog)
 from PySide6.QtGui import QColor, QAction, QIcon, QKeySequence, QShortcut
 from PySide6.QtCore import Qt, QTimer
 from Main_ui import Ui_FPMSoftware
@@ -24,6 +25,15 @@ from Utilities.parameter_dialog import ParameterDialog
 from WindowUI.DisplayOptionsWindow import DisplayOptionsWindow
 from Utilities.status_bar_enhancement import ProfessionalStatusBar
 from Utilities.about_dialog import show_about_dialog
+from Utilities.full_field import reconstruct_full_field
+from Utilities.algorithm_loader import load_algorithm, load_algorithm_config
+from Utilities.reconstruction_worker import ReconstructionWorker, start_worker
+from Utilities.profiling import PhaseProfiler
+from Utilities.result_cache import ResultCache, array_digest
+from Utilities.frame_player import stop_playback
+from Utilities.checkpoint import CHECKPOINT_DIRECTORY, checkpoint_key, checkpoint_path
+from Utilities.resource_estimator import check_memory, estimate_resources, fit_to_memory
+from Utilities.pupil_library import PupilLibrary
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -44,9 +54,16 @@ class MainWindow(QMainWindow):
 
 
         self.mat_data = None  # Initialize data storage
+        self.frame_stats = None  # Per-frame statistics of the loaded imlow, indexed as frames are shown
+        self.spectrum_cache = None  # Raw-frame spectra, computed in the background from the first spectrum view
         self.system_specs_window = None  # Initialize system specs window
         self.recent_files = []  # Store recent files
         self.max_recent_files = 5
+        self.reconstruction_worker = None  # Background reconstruction, if one is running
+        self.reconstruction_thread = None
+        self.reconstruction_profiler = None  # Phase timings of the running reconstruction, if profiled
+        self.result_cache = ResultCache()  # Finished reconstructions, reused for identical re-runs
+        self.pupil_library = PupilLibrary()  # Recovered pupils, reused as priors for later runs
 
         # **ROI parameters (Default ROI: [X-offset, Y-offset, ROI_size, ROI_size])**
         self.roi_params = {"x_offset": 1, "y_offset": 1, "roi_size": 256}
@@ -72,6 +89,14 @@ class MainWindow(QMainWindow):
         self.ui.actionSIngle_ROI.triggered.connect(self.show_single_roi_image)
         self.ui.actionAll_ROI_images.triggered.connect(self.show_all_roi_images)
         self.ui.run_butt.clicked.connect(self.run_selected_algorithm)
+
+        # Cancel button next to Run, shown only while a reconstruction is running
+        self.cancel_butt = QPushButton("Cancel", self.ui.centralwidget)
+        self.cancel_butt.setToolTip("Stop the running reconstruction after the current iteration")
+        self.cancel_butt.setVisible(False)
+        self.cancel_butt.clicked.connect(self.cancel_reconstruction)
+        run_index = self.ui.horizontalLayout_5.indexOf(self.ui.run_butt)
+        self.ui.horizontalLayout_5.insertWidget(run_index + 1, self.cancel_butt)
         self.ui.display_butt.clicked.connect(self.show_display_options)
         
         # Connect result display actions (if they exist in the UI)
@@ -91,6 +116,48 @@ class MainWindow(QMainWindow):
         self.ui.menuHelp.addAction(self.ui.actionAbout)
         self.ui.actionAbout.triggered.connect(self.show_about_dialog)
 
+        # Export the recovered pupil so later runs on the same microscope can start from it
+        self.ui.actionExport_pupil = QAction("Export Pupil...", self)
+        self.ui.menuFile.addAction(self.ui.actionExport_pupil)
+        self.ui.actionExport_pupil.triggered.connect(self.export_pupil)
+
+        # Add full-field tiled reconstruction to the Specs menu
+        self.ui.actionRun_full_field = QAction("Run Full Field", self)
+        self.ui.menuSpecs.addAction(self.ui.actionRun_full_field)
+        self.ui.actionRun_full_field.triggered.connect(self.run_full_field)
+
+        # Optional per-phase profiling of single-ROI reconstructions
+        self.ui.actionProfile_reconstruction = QAction("Profile Reconstruction", self)
+        self.ui.actionProfile_reconstruction.setCheckable(True)
+        self.ui.menuSpecs.addAction(self.ui.actionProfile_reconstruction)
+
+        # Reuse results of identical runs from the on-disk cache
+        self.ui.actionCache_results = QAction("Cache Results", self)
+        self.ui.actionCache_results.setCheckable(True)
+        self.ui.actionCache_results.setChecked(True)
+        self.ui.menuSpecs.addAction(self.ui.actionCache_results)
+        self.ui.actionClear_result_cache = QAction("Clear Result Cache", self)
+        self.ui.menuSpecs.addAction(self.ui.actionClear_result_cache)
+        self.ui.actionClear_result_cache.triggered.connect(self.clear_result_cache)
+
+        # Start the next run from the last result instead of the interpolated raw frame
+        self.ui.actionWarm_start = QAction("Warm Start from Last Result", self)
+        self.ui.actionWarm_start.setCheckable(True)
+        self.ui.menuSpecs.addAction(self.ui.actionWarm_start)
+
+        # Seed runs with the nearest recovered pupil and keep the pupils they recover
+        self.ui.actionPupil_library = QAction("Use Pupil Library", self)
+        self.ui.actionPupil_library.setCheckable(True)
+        self.ui.menuSpecs.addAction(self.ui.actionPupil_library)
+        self.ui.actionClear_pupil_library = QAction("Clear Pupil Library", self)
+        self.ui.menuSpecs.addAction(self.ui.actionClear_pupil_library)
+        self.ui.actionClear_pupil_library.triggered.connect(self.clear_pupil_library)
+
+        # Shrink runs that would not fit in memory instead of refusing them
+        self.ui.actionFit_to_memory = QAction("Fit Runs to Available Memory", self)
+        self.ui.actionFit_to_memory.setCheckable(True)
+        self.ui.actionFit_to_memory.setChecked(True)
+        self.ui.menuSpecs.addAction(self.ui.actionFit_to_memory)
 
         # Connect ROI selection button
         self.ui.roi_butt.clicked.connect(lambda: select_roi_size(self))
@@ -119,6 +186,7 @@ class MainWindow(QMainWindow):
         """Setup keyboard shortcuts for common actions"""
         QShortcut(QKeySequence("Ctrl+O"), self, self.load_data)
         QShortcut(QKeySequence("Ctrl+R"), self, self.run_selected_algorithm)
+        QShortcut(QKeySequence("Ctrl+Shift+R"), self, self.run_full_field)
         QShortcut(QKeySequence("F1"), self, self.show_help)
         QShortcut(QKeySequence("Ctrl+Q"), self, self.close)
         
@@ -164,6 +232,9 @@ class MainWindow(QMainWindow):
             if new_data:
                 # Validate data structure
                 if self.validate_mat_data(new_data):
+                    if self.spectrum_cache is not None:
+                        self.spectrum_cache.cancel()
+                        self.spectrum_cache = None
                     self.mat_data = new_data
                     self.add_to_recent_files(getattr(self, 'current_file_path', ''))
                     self.ui.Msg_window.appendPlainText("[OK] Data loaded successfully.")
@@ -288,14 +359,15 @@ class MainWindow(QMainWindow):
             dialog.show()
 
     def load_algorithm_config(self, algorithm_name):
-        config_path = os.path.join("Algorithms", algorithm_name, "config.yml")
-        if not os.path.exists(config_path):
-            return None
-        with open(config_path, "r") as f:
-            return yaml.safe_load(f)
+        return load_algorithm_config(algorithm_name)
 
     def run_selected_algorithm(self):
-        """Run selected algorithm with improved error handling and progress feedback"""
+        """Run selected algorithm on a background thread with progress feedback"""
+        # Checked first, so a second click does not estimate or benchmark next to the running worker
+        if self.reconstruction_worker is not None:
+            self.ui.Msg_window.appendPlainText("[ERROR] A reconstruction is already running.")
+            return
+
         if not hasattr(self, 'selected_algorithm') or not self.selected_algorithm:
             self.ui.Msg_window.appendPlainText("[ERROR] No algorithm selected.")
             return
@@ -303,66 +375,292 @@ class MainWindow(QMainWindow):
         if not self.mat_data:
             self.ui.Msg_window.appendPlainText("[ERROR] No data loaded.")
             return
-            
+
         try:
-            self.status_bar.showMessage(f"Running {self.selected_algorithm}...")
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
-            
-            # Disable run button during processing
-            self.ui.run_butt.setEnabled(False)
-            self.ui.run_butt.setText("Processing...")
-            
-            module_path = f"Algorithms.{self.selected_algorithm}.main_alg"
-            run_module = __import__(module_path, fromlist=["run_algorithm"])
-            run_algorithm = getattr(run_module, "run_algorithm")
-            
-            # Progress callback
-            def progress_callback(progress):
-                self.progress_bar.setValue(progress)
-                QApplication.processEvents()
-                
-            # Log callback
-            def log_callback(msg):
-                self.ui.Msg_window.appendPlainText(f"[{self.selected_algorithm}] {msg}")
-                QApplication.processEvents()
-            
-            Amp, Phase, Pupil = run_algorithm(
-                system_params=getattr(self, 'algorithm_parameters', {}),
-                roi_params=self.roi_params,
-                mat_data=self.mat_data,
-                log_callback=log_callback,
-                progress_callback=progress_callback
-            )
-            
-            # Store results for display
-            self.reconstruction_result = {
-                "amplitude": Amp.cpu().numpy() if hasattr(Amp, "cpu") else Amp,
-                "phase": Phase.cpu().numpy() if hasattr(Phase, "cpu") else Phase,
-                "pupil": Pupil.cpu().numpy() if hasattr(Pupil, "cpu") else Pupil,
-            }
-            
-            self.ui.Msg_window.appendPlainText(f"[OK] {self.selected_algorithm} completed successfully.")
-            self.status_bar.showMessage("Algorithm completed")
-            
-            # Automatically display amplitude result
-            self.display_amplitude_result()
-            
+            run_algorithm = load_algorithm(self.selected_algorithm)
         except ImportError as e:
             self.ui.Msg_window.appendPlainText(f"[ERROR] Algorithm module not found: {e}")
-        except MemoryError:
+            return
+
+        system_params = dict(getattr(self, 'algorithm_parameters', {}))
+        roi_params = dict(self.roi_params)
+        mat_data = self.mat_data
+
+        # Check the predicted peak memory before anything is allocated
+        try:
+            if self.ui.actionFit_to_memory.isChecked():
+                system_params, roi_params, estimate, changes = fit_to_memory(system_params, roi_params, mat_data)
+                if changes:
+                    self.ui.Msg_window.appendPlainText(
+                        f"[OK] Adjusted to fit available memory: {', '.join(changes)}")
+            else:
+                estimate = estimate_resources(system_params, roi_params, mat_data)
+                check_memory(estimate)
+        except MemoryError as e:
+            self.ui.Msg_window.appendPlainText(f"[ERROR] {e}. Try smaller ROI or reduce upsampling.")
+            return
+        self.ui.Msg_window.appendPlainText(estimate.summary())
+
+        profiler = PhaseProfiler() if self.ui.actionProfile_reconstruction.isChecked() else None
+        result_cache = self.result_cache if self.ui.actionCache_results.isChecked() else None
+        checkpointing = int(system_params.get("checkpoint_interval", 0)) > 0
+        algorithm_name = self.selected_algorithm
+        init = self.warm_start_arrays()
+        pupil_library = self.pupil_library if self.ui.actionPupil_library.isChecked() else None
+        if pupil_library is not None and "init_pupil" not in init:
+            prior = pupil_library.nearest(mat_data, roi_params)
+            if prior is not None:
+                init["init_pupil"], position = prior
+                self.ui.Msg_window.appendPlainText(
+                    f"[OK] Pupil prior from the library entry at ({position[0]:.0f}, {position[1]:.0f}).")
+        store_pupil = pupil_library is not None and bool(system_params.get("pupil_correction"))
+
+        def task(log_callback, progress_callback, cancel_callback):
+            cache_key = None
+            if result_cache is not None or checkpointing:
+                # Identifies the dataset, ROI, parameters and warm start for both the cache and checkpoints
+                cache_key = self.result_cache.make_key(algorithm_name, system_params, roi_params, mat_data, init)
+            if result_cache is not None:
+                # A profiled run has to execute to produce timings
+                cached = result_cache.load(cache_key) if profiler is None else None
+                if cached is not None:
+                    log_callback(f"Loaded cached result ({len(cached['history'])} iterations).")
+                    return cached["amplitude"], cached["phase"], cached["pupil"]
+
+            # Only pass optional hooks when used, so algorithms without them still run
+            history = []
+            extra = dict(init)
+            if profiler is not None:
+                extra["profile_callback"] = profiler
+            if result_cache is not None:
+                extra["error_callback"] = lambda iteration, error: history.append(error)
+            if checkpointing:
+                extra["checkpoint_path"] = checkpoint_path(cache_key)
+
+            result = run_algorithm(
+                system_params=system_params,
+                roi_params=roi_params,
+                mat_data=mat_data,
+                log_callback=log_callback,
+                progress_callback=progress_callback,
+                cancel_callback=cancel_callback,
+                **extra
+            )
+
+            if (result_cache is not None or store_pupil) and not cancel_callback():
+                Amp, Phase, Pupil = (value.cpu().numpy() if hasattr(value, "cpu") else value for value in result)
+                metadata = {"algorithm": algorithm_name, "parameters": system_params, "roi": roi_params}
+                try:
+                    if result_cache is not None:
+                        result_cache.store(cache_key, Amp, Phase, Pupil, history, metadata)
+                except OSError as e:
+                    log_callback(f"[ERROR] Could not cache result: {e}")
+                try:
+                    if store_pupil:
+                        pupil_library.store(Pupil, mat_data, roi_params, metadata)
+                except OSError as e:
+                    log_callback(f"[ERROR] Could not store the pupil in the library: {e}")
+            return result
+
+        self.start_reconstruction(task, f"Running {self.selected_algorithm}...", profiler)
+
+    def run_full_field(self):
+        """Reconstruct the whole field as overlapping tiles on a process pool and stitch them"""
+        if self.reconstruction_worker is not None:
+            self.ui.Msg_window.appendPlainText("[ERROR] A reconstruction is already running.")
+            return
+
+        if not hasattr(self, 'selected_algorithm') or not self.selected_algorithm:
+            self.ui.Msg_window.appendPlainText("[ERROR] No algorithm selected.")
+            return
+
+        if not self.mat_data:
+            self.ui.Msg_window.appendPlainText("[ERROR] No data loaded.")
+            return
+
+        height, width = self.mat_data["imlow"].shape[:2]
+        tile_size, ok = QInputDialog.getInt(
+            self, "Full Field Reconstruction",
+            f"Enter tile size (64 to {min(height, width)} pixels):",
+            min(256, height, width), 64, min(height, width), 1
+        )
+        if not ok:
+            return
+
+        max_workers = os.cpu_count() or 1
+        workers, ok = QInputDialog.getInt(
+            self, "Full Field Reconstruction",
+            f"Enter number of worker processes (1 to {max_workers}):",
+            max_workers, 1, max_workers, 1
+        )
+        if not ok:
+            return
+
+        algorithm_name = self.selected_algorithm
+        system_params = dict(getattr(self, 'algorithm_parameters', {}))
+        mat_data = self.mat_data
+        init = self.warm_start_arrays()
+        pupil_library = self.pupil_library if self.ui.actionPupil_library.isChecked() else None
+
+        # Finished tiles are kept until the whole field is stitched, so a re-run resumes
+        checkpoint_directory = None
+        source = getattr(self, 'current_file_path', None)
+        if source and os.path.exists(source):
+            checkpoint_directory = os.path.join(CHECKPOINT_DIRECTORY, "full-field-" + checkpoint_key(
+                algorithm_name, system_params, tile_size, mat_data["imlow"].shape,
+                os.path.abspath(source), os.path.getmtime(source), array_digest(init) if init else None))
+
+        def task(log_callback, progress_callback, cancel_callback):
+            return reconstruct_full_field(
+                algorithm_name,
+                system_params,
+                mat_data,
+                tile_size=tile_size,
+                overlap=tile_size // 8,
+                workers=workers,
+                checkpoint_directory=checkpoint_directory,
+                pupil_library=pupil_library,
+                log_callback=log_callback,
+                progress_callback=progress_callback,
+                cancel_callback=cancel_callback,
+                **init
+            )
+
+        self.start_reconstruction(task, f"Running {self.selected_algorithm} on the full field...")
+
+    def warm_start_arrays(self):
+        """Initial object and pupil from the last result when warm starting is enabled, else {}"""
+        result = getattr(self, 'reconstruction_result', None)
+        if not self.ui.actionWarm_start.isChecked() or not result:
+            return {}
+        init = {"init_object": (result["amplitude"] * np.exp(1j * result["phase"])).astype("complex64")}
+        if result.get("pupil") is not None:
+            init["init_pupil"] = np.asarray(result["pupil"])
+        self.ui.Msg_window.appendPlainText("[OK] Warm start from the last result.")
+        return init
+
+    def clear_pupil_library(self):
+        """Delete every pupil in the pupil library"""
+        self.pupil_library.clear()
+        self.ui.Msg_window.appendPlainText(f"[OK] Pupil library cleared: {self.pupil_library.directory}")
+
+    def clear_result_cache(self):
+        """Delete every cached reconstruction result"""
+        self.result_cache.clear()
+        self.ui.Msg_window.appendPlainText(f"[OK] Result cache cleared: {self.result_cache.directory}")
+
+    def start_reconstruction(self, task, status_message, profiler=None):
+        """Run a reconstruction task on a worker thread; results arrive through signals"""
+        if self.reconstruction_worker is not None:
+            self.ui.Msg_window.appendPlainText("[ERROR] A reconstruction is already running.")
+            return
+
+        self.reconstruction_profiler = profiler
+
+        self.status_bar.showMessage(status_message)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+
+        # Disable run button and offer cancellation during processing
+        self.ui.run_butt.setEnabled(False)
+        self.ui.run_butt.setText("Processing...")
+        self.cancel_butt.setEnabled(True)
+        self.cancel_butt.setVisible(True)
+
+        self.running_algorithm = self.selected_algorithm
+        self.reconstruction_worker = ReconstructionWorker(task)
+        self.reconstruction_worker.progress.connect(self.on_reconstruction_progress)
+        self.reconstruction_worker.log.connect(self.on_reconstruction_log)
+        self.reconstruction_worker.finished.connect(self.on_reconstruction_finished)
+        self.reconstruction_worker.failed.connect(self.on_reconstruction_failed)
+        self.reconstruction_worker.cancelled.connect(self.on_reconstruction_cancelled)
+        self.reconstruction_worker.done.connect(self.on_reconstruction_done)
+        self.reconstruction_thread = start_worker(self.reconstruction_worker)
+
+    def cancel_reconstruction(self):
+        """Ask the running reconstruction to stop after its current iteration"""
+        if self.reconstruction_worker is not None:
+            self.reconstruction_worker.cancel()
+            self.cancel_butt.setEnabled(False)
+            self.ui.Msg_window.appendPlainText("Cancelling reconstruction...")
+
+    def on_reconstruction_progress(self, progress):
+        self.progress_bar.setValue(progress)
+
+    def on_reconstruction_log(self, msg):
+        self.ui.Msg_window.appendPlainText(f"[{self.running_algorithm}] {msg}")
+
+    def on_reconstruction_finished(self, result):
+        Amp, Phase, Pupil = result
+
+        # Store results for display
+        self.reconstruction_result = {
+            "amplitude": Amp.cpu().numpy() if hasattr(Amp, "cpu") else Amp,
+            "phase": Phase.cpu().numpy() if hasattr(Phase, "cpu") else Phase,
+            "pupil": Pupil.cpu().numpy() if hasattr(Pupil, "cpu") else Pupil,
+        }
+
+        self.ui.Msg_window.appendPlainText(f"[OK] {self.running_algorithm} completed successfully.")
+        self.status_bar.showMessage("Algorithm completed")
+
+        # Automatically display amplitude result
+        self.display_amplitude_result()
+
+        if self.reconstruction_profiler is not None:
+            self.report_profile(self.reconstruction_profiler)
+
+    def report_profile(self, profiler):
+        """Show the phase timing summary and save the Chrome trace to the 'profile_history' folder"""
+        self.ui.Msg_window.appendPlainText(f"[{self.running_algorithm}] Phase timings:\n{profiler.summary_table()}")
+
+        trace_folder = "profile_history"
+        try:
+            os.makedirs(trace_folder, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("trace-date-%m-%d-%Y-time-%I-%M-%S-%p.json")
+            trace_path = os.path.join(trace_folder, timestamp)
+            profiler.save_chrome_trace(trace_path)
+            self.ui.Msg_window.appendPlainText(f"[OK] Chrome trace saved to: {trace_path}")
+        except OSError as e:
+            self.ui.Msg_window.appendPlainText(f"[ERROR] Could not save Chrome trace: {e}")
+
+    def on_reconstruction_failed(self, error):
+        if isinstance(error, ImportError):
+            self.ui.Msg_window.appendPlainText(f"[ERROR] Algorithm module not found: {error}")
+        elif isinstance(error, MemoryError):
             self.ui.Msg_window.appendPlainText("[ERROR] Insufficient memory. Try smaller ROI or reduce upsampling.")
-        except ValueError as e:
-            self.ui.Msg_window.appendPlainText(f"[ERROR] Invalid parameters: {e}")
-        except Exception as e:
-            self.ui.Msg_window.appendPlainText(f"[ERROR] Algorithm failed: {e}")
-        finally:
-            # Re-enable UI
-            self.progress_bar.setVisible(False)
-            self.ui.run_butt.setEnabled(True)
-            self.ui.run_butt.setText("Run")
-            self.update_ui_state()
+        elif isinstance(error, ValueError):
+            self.ui.Msg_window.appendPlainText(f"[ERROR] Invalid parameters: {error}")
+        else:
+            self.ui.Msg_window.appendPlainText(f"[ERROR] Algorithm failed: {error}")
+
+    def on_reconstruction_cancelled(self):
+        self.ui.Msg_window.appendPlainText(f"[{self.running_algorithm}] Reconstruction cancelled.")
+        self.status_bar.showMessage("Algorithm cancelled")
+
+    def on_reconstruction_done(self):
+        # The worker has returned, so the thread is only leaving its event loop
+        self.reconstruction_thread.wait()
+        self.reconstruction_worker = None
+        self.reconstruction_thread = None
+        self.reconstruction_profiler = None
+
+        # Re-enable UI
+        self.progress_bar.setVisible(False)
+        self.cancel_butt.setVisible(False)
+        self.ui.run_butt.setEnabled(True)
+        self.ui.run_butt.setText("Run")
+        self.update_ui_state()
+
+    def closeEvent(self, event):
+        """Stop frame playback and a running reconstruction before the window closes"""
+        stop_playback(self)
+        if self.spectrum_cache is not None:
+            self.spectrum_cache.cancel()
+        if self.reconstruction_worker is not None:
+            self.reconstruction_worker.cancel()
+            self.reconstruction_thread.wait()
+        super().closeEvent(event)
 
     def display_amplitude_result(self):
         """Automatically display the amplitude reconstruction result"""
@@ -386,6 +684,23 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.ui.Msg_window.appendPlainText(f"[ERROR] Error displaying {result_type} result: {e}")
 
+    def export_pupil(self):
+        """Save the last recovered pupil, with its Zernike coefficients, to .npz or .npy"""
+        result = getattr(self, 'reconstruction_result', None)
+        if not result or result.get("pupil") is None:
+            self.ui.Msg_window.appendPlainText("[ERROR] No recovered pupil available. Run an algorithm first.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export pupil", "pupil.npz",
+                                                   "NumPy Files (*.npz *.npy);;All Files (*.*)")
+        if not file_path:
+            return
+        try:
+            from Utilities.pupil_io import save_pupil
+            save_pupil(file_path, result["pupil"], {"algorithm": self.running_algorithm})
+            self.ui.Msg_window.appendPlainText(f"[OK] Pupil exported to {file_path}")
+        except (OSError, ValueError) as e:
+            self.ui.Msg_window.appendPlainText(f"[ERROR] Could not export pupil: {e}")
+
     def apply_professional_theme(self):
         """Apply the professional theme to the application"""
         try:
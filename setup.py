@@ -26,6 +26,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/hwzhou2020/FPM_software",
     packages=find_packages(),
+    py_modules=["fpm_cli"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Science/Research",
@@ -42,6 +43,7 @@ setup(
     entry_points={
         "console_scripts": [
             "fpm-software=main:main",
+            "fpm-reconstruct=fpm_cli:main",
         ],
     },
     include_package_data=True,